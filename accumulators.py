@@ -0,0 +1,375 @@
+# Streaming accumulators for per-site simulation statistics
+#
+# VALUES come block by block as (runs x sites) arrays, e.g. the scores or
+# ranks of a block of Monte Carlo runs; nothing is kept per run, so memory
+# depends on the number of sites only, whatever the number of runs
+#
+# Variances use the parallel (Chan et al.) form of Welford's update, so two
+# accumulators filled on different blocks can be merged exactly
+#
+# STANDARD ERRORS of the mean and of the standard deviation need the fourth
+# central moment, which is tracked on request as power sums about a fixed
+# shift (the mean of the first block)
+#
+# BOOTSTRAP totals use the Poisson bootstrap: every run enters each replicate
+# with an independent Poisson(1) weight, so replicates are built block by
+# block (and merged) without keeping the runs
+#
+# CO-MOMENTS of k variables (e.g. the criteria of a table read in row chunks)
+# are merged the same way as the variances, giving covariance and Pearson
+# correlation matrices in one pass
+#
+# RANK ACCEPTABILITY (SMAA) counts how often every site lands at every rank:
+# each block of integer ranks is added with one bincount over site*width +
+# rank - 1. The table is dense (sites x sites) for small problems; for
+# large ones only the ranks 1..K are counted, in a SPARSE table of the
+# (site, rank) cells reached at least once (sorted site*K + rank - 1 keys
+# with their counts), which grows with the sites that ever reach the top K
+# rather than with all sites, and still gives the first-rank acceptability
+# and the probability of the top K
+#
+# WINNING INDICES count how often site i scores higher than site j over the
+# runs, for a shortlist of m sites: every block of scores is compared with
+# broadcasting as a (runs x m x m) boolean array, a few runs at a time so
+# the comparison fits in memory, and summed over the runs
+#------------- IMPORTS ------------------------------------------------
+from math import comb
+import numpy
+
+from ranking import COMPARE_ELEMENTS
+
+# ----- class definitions ----------------------------------------------
+
+class RunningStatistics(object):
+    """ per-site count, mean, variance, min, max and an optional
+        fixed-bin histogram sketch for quantiles """
+
+    def __init__(self, n, bins=0, lo=0.0, hi=1.0, moments=False):
+        """
+            in: n number of sites (int), bins number of histogram bins per site
+                for the quantile sketch (int, 0 disables it), lo and hi the
+                value range covered by the histogram (floats),
+                moments tracks the moments needed by the standard errors (bool)
+        """
+        self.n = int(n)
+        self.count = 0
+        self.total = numpy.zeros(self.n, dtype=float)
+        self.m2 = numpy.zeros(self.n, dtype=float)
+        self.minimum = numpy.full(self.n, numpy.inf)
+        self.maximum = numpy.full(self.n, -numpy.inf)
+        self.bins = int(bins)
+        self.lo = float(lo)
+        self.hi = float(hi)
+        self.hist = numpy.zeros((self.n, self.bins), dtype=numpy.int64) if self.bins else None
+        self.moments = moments
+        self.shift = None
+        self.power = numpy.zeros((4, self.n), dtype=float) if moments else None
+
+    def update(self, block):
+        """ adds a (runs x sites) block of values """
+        block = numpy.atleast_2d(block)
+        runs = block.shape[0]
+        if runs == 0:
+            return self
+        bmean = block.mean(axis=0, dtype=float)
+        bm2 = ((block - bmean)**2).sum(axis=0)
+        self._combine(runs, bmean, bm2)
+        # the running totals enter the first row and the block is reduced
+        # along the runs, which adds the rows in order (no pairwise sum), so
+        # the totals equal the sums taken run after run
+        rows = numpy.array(block, dtype=float)
+        rows[0] += self.total
+        self.total = rows.sum(axis=0)
+        self.count += runs
+        numpy.minimum(self.minimum, block.min(axis=0), out=self.minimum)
+        numpy.maximum(self.maximum, block.max(axis=0), out=self.maximum)
+        if self.bins:
+            scaled = (block - self.lo)*(self.bins/(self.hi - self.lo))
+            binidx = numpy.clip(scaled.astype(numpy.int64), 0, self.bins - 1)
+            binidx += numpy.arange(self.n, dtype=numpy.int64)*self.bins
+            self.hist += numpy.bincount(binidx.ravel(), minlength=self.n*self.bins).reshape(self.n, self.bins)
+        if self.moments:
+            if self.shift is None:
+                self.shift = bmean
+            deviation = block - self.shift
+            term = numpy.ones_like(deviation)
+            for p in range(4):
+                term *= deviation
+                self.power[p] += term.sum(axis=0)
+        return self
+
+    def merge(self, other):
+        """ merges the statistics of another accumulator into this one """
+        if other.n != self.n or other.bins != self.bins or other.moments != self.moments:
+            raise ValueError("cannot merge accumulators of different shapes")
+        if other.count == 0:
+            return self
+        if self.moments:
+            if self.shift is None:
+                self.shift = other.shift
+            # power sums of the other accumulator moved to this shift
+            offset = other.shift - self.shift
+            sums = [numpy.full(self.n, float(other.count))] + list(other.power)
+            for p in range(1, 5):
+                self.power[p-1] += sum(comb(p, i)*offset**(p-i)*sums[i] for i in range(p+1))
+        self._combine(other.count, other.total/other.count, other.m2)
+        self.total += other.total
+        self.count += other.count
+        numpy.minimum(self.minimum, other.minimum, out=self.minimum)
+        numpy.maximum(self.maximum, other.maximum, out=self.maximum)
+        if self.bins:
+            self.hist += other.hist
+        return self
+
+    def _combine(self, count, mean, m2):
+        """ Chan's parallel update of the sum of squared deviations """
+        if self.count == 0:
+            self.m2 = numpy.array(m2, dtype=float)
+            return
+        delta = mean - self.total/self.count
+        newcount = self.count + count
+        self.m2 = self.m2 + m2 + delta*delta*(self.count*count/float(newcount))
+
+    def mean(self):
+        """ returns the per-site mean """
+        return self.total/float(self.count)
+
+    def var(self, ddof=0):
+        """ returns the per-site variance """
+        return self.m2/float(self.count - ddof)
+
+    def std(self, ddof=0):
+        """ returns the per-site standard deviation """
+        return numpy.sqrt(self.var(ddof))
+
+    def stdError(self):
+        """ returns the per-site standard error of the mean """
+        return numpy.sqrt(self.var(1 if self.count > 1 else 0)/self.count)
+
+    def stdStdError(self):
+        """ returns the per-site standard error of the standard deviation
+            (delta method, needs moments=True) """
+        if not self.moments:
+            raise ValueError("moments disabled; create the accumulator with moments=True")
+        raw = self.power/self.count
+        mu = raw[0]
+        m4 = raw[3] - 4*mu*raw[2] + 6*mu**2*raw[1] - 3*mu**4
+        var = self.var()
+        std = numpy.sqrt(var)
+        spread = numpy.sqrt(numpy.maximum(m4 - var**2, 0.0)/self.count)
+        return numpy.where(std > 0, spread/(2*numpy.where(std > 0, std, 1.0)), 0.0)
+
+    def quantile(self, q):
+        """ returns per-site approximate q-quantiles from the histogram sketch,
+            linearly interpolated within the bin; the error is at most one
+            bin width (hi-lo)/bins """
+        if not self.bins:
+            raise ValueError("quantile sketch disabled; create the accumulator with bins > 0")
+        width = (self.hi - self.lo)/self.bins
+        cum = numpy.cumsum(self.hist, axis=1)
+        target = q*self.count
+        binidx = numpy.minimum((cum < target).sum(axis=1), self.bins - 1)
+        sites = numpy.arange(self.n)
+        below = numpy.where(binidx > 0, cum[sites, binidx - 1], 0)
+        inbin = numpy.maximum(self.hist[sites, binidx], 1)
+        frac = numpy.clip((target - below)/inbin, 0.0, 1.0)
+        return self.lo + (binidx + frac)*width
+
+class BootstrapTotals(object):
+    """ Poisson bootstrap replicates of the column totals of a stream of
+        (runs x m) blocks """
+
+    def __init__(self, replicates, m):
+        """
+            in: replicates number of bootstrap replicates (int),
+                m number of columns (int)
+        """
+        self.replicates = int(replicates)
+        self.m = int(m)
+        # column 0 holds the total weight of every replicate
+        self.totals = numpy.zeros((self.replicates, self.m + 1), dtype=float)
+
+    def update(self, block, rng):
+        """ adds a (runs x m) block with weights drawn from rng (numpy Generator) """
+        block = numpy.atleast_2d(block)
+        weights = rng.poisson(1.0, (self.replicates, block.shape[0])).astype(float)
+        self.totals[:, 0] += weights.sum(axis=1)
+        self.totals[:, 1:] += weights @ block
+        return self
+
+    def merge(self, other):
+        """ merges the replicates of another accumulator into this one """
+        if other.replicates != self.replicates or other.m != self.m:
+            raise ValueError("cannot merge accumulators of different shapes")
+        self.totals += other.totals
+        return self
+
+    def means(self):
+        """ returns the (replicates x m) column means of every replicate """
+        return self.totals[:, 1:]/numpy.maximum(self.totals[:, :1], 1.0)
+
+class CoMoments(object):
+    """ count, means and co-moment matrix of k variables """
+
+    def __init__(self, k):
+        """ in: k number of variables (int) """
+        self.k = int(k)
+        self.count = 0
+        self.means = numpy.zeros(self.k, dtype=float)
+        self.comoments = numpy.zeros((self.k, self.k), dtype=float)
+
+    def update(self, block):
+        """ adds a (rows x k) block of observations """
+        block = numpy.atleast_2d(numpy.asarray(block, dtype=float))
+        if block.shape[0] == 0:
+            return self
+        other = CoMoments(self.k)
+        other.count = block.shape[0]
+        other.means = block.mean(axis=0)
+        centered = block - other.means
+        other.comoments = centered.T @ centered
+        return self.merge(other)
+
+    def merge(self, other):
+        """ merges the co-moments of another accumulator into this one """
+        if other.k != self.k:
+            raise ValueError("cannot merge accumulators of different shapes")
+        if other.count == 0:
+            return self
+        newcount = self.count + other.count
+        delta = other.means - self.means
+        self.comoments = self.comoments + other.comoments + \
+                         numpy.outer(delta, delta)*(self.count*other.count/float(newcount))
+        self.means = self.means + delta*(other.count/float(newcount))
+        self.count = newcount
+        return self
+
+    def covariance(self, ddof=1):
+        """ returns the (k x k) covariance matrix """
+        return self.comoments/float(self.count - ddof)
+
+    def correlation(self):
+        """ returns the (k x k) Pearson correlation matrix; NaN for constant variables """
+        spread = numpy.sqrt(numpy.diag(self.comoments))
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            r = self.comoments/numpy.outer(spread, spread)
+        r = numpy.clip(r, -1.0, 1.0)
+        numpy.fill_diagonal(r, numpy.where(spread > 0, 1.0, numpy.nan))
+        return r
+
+class RankAcceptability(object):
+    """ per-site counts of the runs at every rank (dense), or at the ranks
+        1..topk (sparse) """
+
+    def __init__(self, n, ranks=None, topk=None):
+        """
+            in: n number of sites counted (int), ranks number of ranks (int,
+                None for n), topk number of best ranks counted (int, None
+                counts all ranks)
+        """
+        self.n = int(n)
+        self.ranks = self.n if ranks is None else int(ranks)
+        self.width = self.ranks if topk is None else max(1, min(int(topk), self.ranks))
+        self.sparse = topk is not None
+        self.count = 0
+        if self.sparse:
+            # sorted site*width + rank - 1 keys of the cells reached, and their counts
+            self.cells = numpy.zeros(0, dtype=numpy.int64)
+            self.runs = numpy.zeros(0, dtype=numpy.int64)
+        else:
+            self.counts = numpy.zeros((self.n, self.width), dtype=numpy.int64)
+
+    def addCells(self, cells, runs):
+        """ adds the runs of the cells (site*width + rank - 1 keys) to the sparse table """
+        cells = numpy.concatenate([self.cells, cells])
+        runs = numpy.concatenate([self.runs, runs])
+        order = numpy.argsort(cells, kind="stable")
+        cells, runs = cells[order], runs[order]
+        new = numpy.ones(len(cells), dtype=bool)
+        new[1:] = cells[1:] != cells[:-1]
+        starts = numpy.flatnonzero(new)
+        self.cells = cells[starts]
+        self.runs = numpy.add.reduceat(runs, starts) if len(starts) else runs
+
+    def update(self, block):
+        """ adds a (runs x sites) block of integer ranks (1 is the best) """
+        block = numpy.atleast_2d(block)
+        if block.shape[0] == 0:
+            return self
+        ranks = block.astype(numpy.int64) - 1
+        counted = ranks < self.width
+        cells = (numpy.arange(self.n, dtype=numpy.int64)[None, :]*self.width + ranks)[counted]
+        if self.sparse:
+            cells, runs = numpy.unique(cells, return_counts=True)
+            self.addCells(cells, runs.astype(numpy.int64))
+        else:
+            self.counts += numpy.bincount(cells, minlength=self.n*self.width).reshape(self.n, self.width)
+        self.count += block.shape[0]
+        return self
+
+    def merge(self, other):
+        """ merges the counts of another accumulator into this one """
+        if other.n != self.n or other.width != self.width or other.sparse != self.sparse:
+            raise ValueError("cannot merge accumulators of different shapes")
+        if self.sparse:
+            self.addCells(other.cells, other.runs)
+        else:
+            self.counts += other.counts
+        self.count += other.count
+        return self
+
+    def nonzero(self):
+        """ returns (sites, ranks, runs) of the counted cells, ranks from 0 """
+        if self.sparse:
+            return self.cells//self.width, self.cells % self.width, self.runs
+        sites, ranks = numpy.nonzero(self.counts)
+        return sites, ranks, self.counts[sites, ranks]
+
+    def acceptability(self):
+        """ returns the (sites x width) share of the runs at every rank """
+        counts = numpy.zeros((self.n, self.width), dtype=numpy.int64)
+        sites, ranks, runs = self.nonzero()
+        counts[sites, ranks] = runs
+        return counts/float(max(self.count, 1))
+
+    def topProbability(self, k):
+        """ returns the share of the runs every site ranks k or better """
+        if k > self.width:
+            raise ValueError("only the ranks 1.."+str(self.width)+" were counted")
+        sites, ranks, runs = self.nonzero()
+        best = ranks < k
+        return numpy.bincount(sites[best], weights=runs[best], minlength=self.n)/float(max(self.count, 1))
+
+class WinningIndex(object):
+    """ pairwise counts of the runs in which site i scores higher than site j """
+
+    def __init__(self, m):
+        """ in: m number of sites compared (int) """
+        self.m = int(m)
+        self.count = 0
+        self.wins = numpy.zeros((self.m, self.m), dtype=numpy.int64)
+
+    def update(self, block):
+        """ adds a (runs x m) block of scores """
+        block = numpy.atleast_2d(block)
+        step = max(1, COMPARE_ELEMENTS//max(self.m*self.m, 1))
+        for start in range(0, block.shape[0], step):
+            scores = block[start:start+step]
+            self.wins += (scores[:, :, None] > scores[:, None, :]).sum(axis=0)
+        self.count += block.shape[0]
+        return self
+
+    def merge(self, other):
+        """ merges the counts of another accumulator into this one """
+        if other.m != self.m:
+            raise ValueError("cannot merge accumulators of different shapes")
+        self.wins += other.wins
+        self.count += other.count
+        return self
+
+    def winning(self):
+        """ returns the (m x m) winning indices: the share of the runs in
+            which site i scores higher than site j (ties count as half) """
+        ties = self.count - self.wins - self.wins.T
+        numpy.fill_diagonal(ties, 0)
+        return (self.wins + ties/2.0)/float(max(self.count, 1))
@@ -0,0 +1,154 @@
+# Correlation matrices of criteria, to check them for redundancy before weighting
+#
+# All selected fields are read in one columnar pass; the PEARSON matrix is
+# computed from the co-moments of the fields (see accumulators.CoMoments) and
+# the SPEARMAN matrix as the Pearson matrix of the field ranks (tied values
+# share the average rank)
+#
+# In STREAMING mode (chunkrows given) the table is read in row chunks and
+# only the co-moments are kept, so memory does not grow with the number of
+# rows; Spearman needs the ranks of the whole table and is not streamed
+#
+# Rows with an empty value in any selected field are left out
+#
+# SIGNIFICANCE of every r: t = r*sqrt((n-2)/(1-r*r)) with n-2 degrees of
+# freedom and a two-sided p-value from the Student t distribution (scipy if
+# installed, otherwise the regularized incomplete beta function below).
+# The original PearsonFC.py computed r*sqrt(n - 2/(1-r*r)) instead
+#------------- IMPORTS ------------------------------------------------
+import math
+import numpy
+
+from accumulators import CoMoments
+from decision_matrix import getBackend, splitFields, readColumnChunks
+from ranking import rankBlock
+
+METHODS = ("pearson", "spearman")
+
+# continued fraction of the incomplete beta function
+BETA_ITERATIONS = 300
+BETA_EPSILON = 1e-15
+
+# ----- function definitions -------------------------------------------
+
+def completeRows(matrix):
+    """ returns the rows of matrix without empty (NaN) values """
+    matrix = numpy.asarray(matrix, dtype=float)
+    return matrix[~numpy.isnan(matrix).any(axis=1)]
+
+def pearsonMatrix(matrix):
+    """ returns the (k x k) Pearson correlation matrix of the columns of matrix """
+    return CoMoments(matrix.shape[1]).update(matrix).correlation()
+
+def spearmanMatrix(matrix):
+    """ returns the (k x k) Spearman rank correlation matrix of the columns of matrix """
+    ranks = rankBlock(numpy.transpose(matrix), "average")
+    return pearsonMatrix(numpy.transpose(ranks).astype(float))
+
+def _betaFraction(a, b, x):
+    """ returns the continued fraction of the incomplete beta function (Lentz) """
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b)*x/(a + 1.0)
+    d = 1.0/(d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, BETA_ITERATIONS + 1):
+        for numerator in (m*(b - m)*x/((a + 2*m - 1)*(a + 2*m)),
+                          -(a + m)*(a + b + m)*x/((a + 2*m)*(a + 2*m + 1))):
+            d = 1.0 + numerator*d
+            d = 1.0/(d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator/c
+            c = c if abs(c) > tiny else tiny
+            result *= c*d
+        if abs(c*d - 1.0) < BETA_EPSILON:
+            break
+    return result
+
+def incompleteBeta(a, b, x):
+    """ returns the regularized incomplete beta function I_x(a, b) """
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) +
+                     a*math.log(x) + b*math.log1p(-x))
+    if x < (a + 1.0)/(a + b + 2.0):
+        return front*_betaFraction(a, b, x)/a
+    return 1.0 - front*_betaFraction(b, a, 1.0 - x)/b
+
+def tStatistics(r, n):
+    """ returns the t statistics of correlations r from n observations """
+    r = numpy.asarray(r, dtype=float)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return r*numpy.sqrt((n - 2)/(1.0 - r*r))
+
+def pValues(t, df):
+    """ returns the two-sided p-values of t statistics with df degrees of freedom """
+    t = numpy.asarray(t, dtype=float)
+    try:
+        from scipy import stats
+        return 2.0*stats.t.sf(numpy.abs(t), df)
+    except ImportError:
+        pass
+    p = numpy.full(t.shape, numpy.nan)
+    for index, value in numpy.ndenumerate(t):
+        if not numpy.isnan(value):
+            p[index] = incompleteBeta(df/2.0, 0.5, df/(df + value*value)) if numpy.isfinite(value) else 0.0
+    return p
+
+def correlationMatrices(table, fields, methods=METHODS, chunkrows=None, backend=None):
+    """
+        in: table path or layer name (string), fields (list or ';'-delimited string),
+            methods correlation methods (see METHODS),
+            chunkrows number of rows read at once (int, None reads the whole table),
+            backend reading the table (None picks one from the table path)
+        out: (n, matrices) the number of complete rows and a dictionary of
+             method -> (k x k) correlation matrix
+    """
+    fields = splitFields(fields)
+    methods = [method.lower() for method in methods]
+    for method in methods:
+        if method not in METHODS:
+            raise ValueError("unknown correlation method "+method+"; use one of "+", ".join(METHODS))
+    if len(fields) < 2:
+        raise ValueError("at least two fields are needed")
+    if backend is None:
+        backend = getBackend(table)
+    if chunkrows is not None:
+        if "spearman" in methods:
+            raise ValueError("Spearman correlations need the whole table; leave the rows read at once empty")
+        comoments = CoMoments(len(fields))
+        for oids, matrix in readColumnChunks(table, fields, chunkrows, backend):
+            comoments.update(completeRows(matrix))
+        n, matrices = comoments.count, {"pearson": comoments.correlation()}
+    else:
+        matrix = completeRows(backend.readColumns(table, fields)[1])
+        n = len(matrix)
+        matrices = {}
+        if "pearson" in methods:
+            matrices["pearson"] = pearsonMatrix(matrix)
+        if "spearman" in methods:
+            matrices["spearman"] = spearmanMatrix(matrix)
+    if n < 3:
+        raise ValueError("at least three rows with values in every field are needed")
+    return n, matrices
+
+def formatCorrelations(title, field_names, r, n, threshold=None):
+    """ returns the correlation matrix and the list of field pairs with their
+        r, t and p-values, strongest first; pairs with |r| >= threshold are
+        marked as redundant """
+    t = tStatistics(r, n)
+    p = pValues(t, n - 2)
+    result = title+" (n = "+str(n)+")\n\t"+"\t".join(field_names)+"\n"
+    for i, field in enumerate(field_names):
+        result += field+"\t"+"\t".join(str(round(value, 3)) for value in r[i])+"\n"
+    result += "\nField 1\tField 2\tr\tt\tp-value"+("\tRedundant" if threshold is not None else "")+"\n"
+    pairs = [(i, j) for i in range(len(field_names)) for j in range(i+1, len(field_names))]
+    pairs.sort(key=lambda pair: -abs(numpy.nan_to_num(r[pair])))
+    for i, j in pairs:
+        result += field_names[i]+"\t"+field_names[j]+"\t"+str(round(r[i, j], 3))+"\t"+\
+                  str(round(t[i, j], 3))+"\t"+"%.3g" % p[i, j]
+        if threshold is not None:
+            result += "\t"+("yes" if abs(r[i, j]) >= threshold else "")
+        result += "\n"
+    return result
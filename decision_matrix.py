@@ -0,0 +1,622 @@
+# Loading of standardized decision matrices and bulk write-back of results
+#
+# All requested criteria (fields) are read in a single columnar pass into a
+# contiguous float64 (sites x criteria) array, together with the ObjectID
+# vector that aligns the rows with the table; values must be within the
+# 0.0 - 1.0 range, otherwise an error is raised
+#
+# BACKENDS read the columns from different storage:
+#   ArcpyBackend   - feature classes / tables / layers through arcpy.da
+#   CSVBackend     - comma separated text file with a header row
+#   NPYBackend     - numpy structured array saved with numpy.save
+#   SQLiteBackend  - table of a SQLite database or GeoPackage
+# the local backends stand in for a geodatabase on machines without ArcGIS
+#
+# OUTPUT columns (numpy arrays keyed by field name, aligned with an ObjectID
+# vector) are written back by the same backends in one pass; missing fields
+# are added as DOUBLE (floats) or LONG (integers)
+#
+# CHUNKED access for tables larger than memory: the backends also read
+# columns as a sequence of (oids, matrix) chunks of at most chunkrows rows,
+# and write output columns from such a sequence, given in the order the rows
+# are read, in one streaming pass (as DOUBLE, or LONG for integer fields);
+# empty values are read as NaN
+#------------- IMPORTS ------------------------------------------------
+import os, csv, sqlite3, itertools, tempfile
+from contextlib import closing
+import numpy
+from numpy.lib import recfunctions
+
+# name of the ObjectID column in the local backends
+OID_FIELD = "OBJECTID"
+SQLITE_EXTENSIONS = (".sqlite", ".db", ".gpkg")
+# rows of a CSV file with empty values parsed at once
+CSV_CHUNK_ROWS = 2**16
+
+# ----- backends -------------------------------------------------------
+
+class ArcpyBackend(object):
+    """ reads and writes tables, feature classes and layers with arcpy """
+
+    def __init__(self, method="extend"):
+        """ method "extend" joins all columns with one arcpy.da.ExtendTable
+            call, "cursor" updates them in one arcpy.da.UpdateCursor pass """
+        self.method = method
+
+    def readColumns(self, table, fields):
+        """ returns (oids, matrix) read in one pass over table """
+        import arcpy
+        data = arcpy.da.TableToNumPyArray(table, ["OID@"] + list(fields))
+        return structuredColumns(data, "OID@", fields)
+
+    def readCentroids(self, table):
+        """ returns (oids, x, y) of the true centroids of the features of table """
+        import arcpy
+        data = arcpy.da.FeatureClassToNumPyArray(table, ["OID@", "SHAPE@TRUECENTROID"])
+        centroids = numpy.asarray(data["SHAPE@TRUECENTROID"], dtype=float).reshape(len(data), 2)
+        return numpy.asarray(data["OID@"], dtype=numpy.int64), centroids[:, 0], centroids[:, 1]
+
+    def readColumnChunks(self, table, fields, chunkrows):
+        """ yields (oids, matrix) chunks of at most chunkrows rows of table """
+        import arcpy
+        with arcpy.da.SearchCursor(table, ["OID@"] + list(fields)) as cursor:
+            while True:
+                rows = list(itertools.islice(cursor, chunkrows))
+                if not rows:
+                    return
+                data = numpy.array(rows, dtype=float).reshape(len(rows), len(fields)+1)
+                yield data[:, 0].astype(numpy.int64), numpy.ascontiguousarray(data[:, 1:])
+
+    def stamp(self, table):
+        """ returns (dataset path, state) of table, or None when its edit state
+            cannot be told from the file system (e.g. enterprise geodatabases) """
+        import arcpy
+        desc = arcpy.Describe(table)
+        path = desc.catalogPath
+        modified = fileStamp(path)
+        if modified is None:
+            return None
+        rowcount = int(arcpy.management.GetCount(table)[0])
+        # layers and table views honour selections and definition queries
+        view = (getattr(desc, "FIDSet", "") or "", getattr(desc, "whereClause", "") or "")
+        return path, (rowcount, modified, view)
+
+    def writeColumns(self, table, oids, columns):
+        """ writes output columns to the rows of table with the given oids """
+        import arcpy
+        columns = {name: arcpyColumn(values) for name, values in columns.items()}
+        if self.method == "extend":
+            try:
+                oidname = arcpy.Describe(table).OIDFieldName
+                array = numpy.empty(len(oids), dtype=[("OID_JOIN_", numpy.int32)] +
+                                    [(name, values.dtype) for name, values in columns.items()])
+                array["OID_JOIN_"] = oids
+                for name, values in columns.items():
+                    array[name] = values
+                arcpy.da.ExtendTable(table, oidname, array, "OID_JOIN_", append_only=False)
+                return
+            except (RuntimeError, TypeError, arcpy.ExecuteError):
+                # e.g. layers and views that ExtendTable cannot modify
+                pass
+        existing = set(f.name.upper() for f in arcpy.ListFields(table))
+        newfields = [[name, "LONG" if values.dtype.kind == "i" else "DOUBLE"]
+                     for name, values in columns.items() if name.upper() not in existing]
+        if newfields:
+            arcpy.management.AddFields(table, newfields)
+        position = dict(zip(numpy.asarray(oids).tolist(), range(len(oids))))
+        rows = list(zip(*[values.tolist() for values in columns.values()]))
+        with arcpy.da.UpdateCursor(table, ["OID@"] + list(columns)) as cursor:
+            for row in cursor:
+                i = position.get(row[0])
+                if i is not None:
+                    cursor.updateRow((row[0],) + rows[i])
+
+    def writeColumnChunks(self, table, fields, chunks, integer=()):
+        """ writes (oids, matrix) chunks of output fields in one pass over table """
+        import arcpy
+        existing = set(f.name.upper() for f in arcpy.ListFields(table))
+        newfields = [[name, "LONG" if name in integer else "DOUBLE"]
+                     for name in fields if name.upper() not in existing]
+        if newfields:
+            arcpy.management.AddFields(table, newfields)
+        with arcpy.da.UpdateCursor(table, ["OID@"] + list(fields)) as cursor:
+            rows = iter(cursor)
+            for oids, values in chunks:
+                for oid, row in zip(oids.tolist(), chunkValues(values, fields, integer)):
+                    if next(rows)[0] != oid:
+                        raise ValueError(table+" changed while it was written")
+                    cursor.updateRow([oid] + row)
+
+class CSVBackend(object):
+    """ reads and writes comma separated text files; rows are numbered from 1 when the
+        file has no ObjectID column """
+
+    def __init__(self, oidfield=OID_FIELD):
+        self.oidfield = oidfield
+
+    def readColumns(self, table, fields):
+        """ returns (oids, matrix) read in one pass over table """
+        with open(table, newline="") as f:
+            header = next(csv.reader(f))
+            missing = [field for field in fields if field not in header]
+            if missing:
+                raise ValueError("fields not found in "+table+": "+", ".join(missing))
+            usecols = [header.index(field) for field in fields]
+            hasoid = self.oidfield in header
+            if hasoid:
+                usecols = [header.index(self.oidfield)] + usecols
+            try:
+                data = numpy.loadtxt(f, delimiter=",", usecols=usecols, ndmin=2, dtype=float)
+            except ValueError:
+                data = None
+        if data is None:
+            # empty values, read as NaN value by value
+            chunks = list(self.readColumnChunks(table, fields, CSV_CHUNK_ROWS))
+            return (numpy.concatenate([oids for oids, matrix in chunks]),
+                    numpy.ascontiguousarray(numpy.concatenate([matrix for oids, matrix in chunks])))
+        if hasoid:
+            return data[:, 0].astype(numpy.int64), numpy.ascontiguousarray(data[:, 1:])
+        return numpy.arange(1, len(data)+1, dtype=numpy.int64), numpy.ascontiguousarray(data)
+
+    def readColumnChunks(self, table, fields, chunkrows):
+        """ yields (oids, matrix) chunks of at most chunkrows rows of table """
+        with open(table, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            missing = [field for field in fields if field not in header]
+            if missing:
+                raise ValueError("fields not found in "+table+": "+", ".join(missing))
+            usecols = [header.index(field) for field in fields]
+            oidcol = header.index(self.oidfield) if self.oidfield in header else None
+            start = 1
+            while True:
+                rows = list(itertools.islice(reader, chunkrows))
+                if not rows:
+                    return
+                matrix = numpy.array([[csvValue(row[j]) for j in usecols] for row in rows],
+                                     dtype=float).reshape(len(rows), len(fields))
+                if oidcol is None:
+                    oids = numpy.arange(start, start+len(rows), dtype=numpy.int64)
+                else:
+                    oids = numpy.array([int(float(row[oidcol])) for row in rows], dtype=numpy.int64)
+                start += len(rows)
+                yield oids, matrix
+
+    def stamp(self, table):
+        """ returns (file path, state) of table """
+        return os.path.abspath(table), (None, fileStamp(table))
+
+    def writeColumns(self, table, oids, columns):
+        """ writes output columns to the rows of table with the given oids """
+        with open(table, newline="") as f:
+            rows = list(csv.reader(f))
+        header, rows = rows[0], rows[1:]
+        if self.oidfield in header:
+            rowoids = numpy.array([int(float(row[header.index(self.oidfield)])) for row in rows])
+        else:
+            rowoids = numpy.arange(1, len(rows)+1)
+        index = alignRows(rowoids, oids)
+        for name, values in columns.items():
+            values = numpy.asarray(values)
+            if name not in header:
+                header.append(name)
+                for row in rows:
+                    row.append("")
+            j = header.index(name)
+            for row, i in zip(rows, index.tolist()):
+                if i >= 0:
+                    row[j] = repr(values[i].item())
+        with open(table, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def writeColumnChunks(self, table, fields, chunks, integer=()):
+        """ writes (oids, matrix) chunks of output fields in one pass over table,
+            streamed to a new copy of the file that replaces it """
+        handle, path = tempfile.mkstemp(suffix=".csv", dir=os.path.dirname(os.path.abspath(table)))
+        try:
+            with open(table, newline="") as f, open(handle, "w", newline="") as out:
+                reader = csv.reader(f)
+                writer = csv.writer(out)
+                header = next(reader)
+                oidcol = header.index(self.oidfield) if self.oidfield in header else None
+                for name in fields:
+                    if name not in header:
+                        header.append(name)
+                columns = [header.index(name) for name in fields]
+                writer.writerow(header)
+                number = 0
+                for oids, values in chunks:
+                    rows = list(itertools.islice(reader, len(oids)))
+                    if len(rows) != len(oids):
+                        raise ValueError(table+" changed while it was written")
+                    for row, oid, rowvalues in zip(rows, oids.tolist(), chunkValues(values, fields, integer)):
+                        number += 1
+                        if (number if oidcol is None else int(float(row[oidcol]))) != oid:
+                            raise ValueError(table+" changed while it was written")
+                        row.extend([""]*(len(header) - len(row)))
+                        for j, value in zip(columns, rowvalues):
+                            row[j] = repr(value)
+                    writer.writerows(rows)
+                for row in reader:
+                    row.extend([""]*(len(header) - len(row)))
+                    writer.writerow(row)
+        except BaseException:
+            os.remove(path)
+            raise
+        os.replace(path, table)
+
+class NPYBackend(object):
+    """ reads and writes numpy structured arrays saved as .npy; rows are numbered from 1
+        when the array has no ObjectID field """
+
+    def __init__(self, oidfield=OID_FIELD):
+        self.oidfield = oidfield
+
+    def readColumns(self, table, fields):
+        """ returns (oids, matrix) read in one pass over table """
+        data = numpy.load(table, mmap_mode="r")
+        return structuredColumns(data, self.oidfield, fields)
+
+    def readColumnChunks(self, table, fields, chunkrows):
+        """ yields (oids, matrix) chunks of at most chunkrows rows of table """
+        data = numpy.load(table, mmap_mode="r")
+        for start in range(0, len(data), chunkrows):
+            oids, matrix = structuredColumns(data[start:start+chunkrows], self.oidfield, fields)
+            if self.oidfield not in data.dtype.names:
+                oids += start
+            yield oids, matrix
+
+    def stamp(self, table):
+        """ returns (file path, state) of table """
+        rowcount = len(numpy.load(table, mmap_mode="r"))
+        return os.path.abspath(table), (rowcount, fileStamp(table))
+
+    def writeColumns(self, table, oids, columns):
+        """ writes output columns to the rows of table with the given oids """
+        data = numpy.load(table)
+        if self.oidfield in data.dtype.names:
+            rowoids = data[self.oidfield]
+        else:
+            rowoids = numpy.arange(1, len(data)+1)
+        index = alignRows(rowoids, oids)
+        found = index >= 0
+        new = [(name, numpy.asarray(values).dtype) for name, values in columns.items()
+               if name not in data.dtype.names]
+        if new:
+            data = recfunctions.append_fields(data, [name for name, dtype in new],
+                                              [numpy.zeros(len(data), dtype) for name, dtype in new],
+                                              usemask=False)
+        for name, values in columns.items():
+            data[name][found] = numpy.asarray(values)[index[found]]
+        numpy.save(table, data)
+
+    def writeColumnChunks(self, table, fields, chunks, integer=()):
+        """ writes (oids, matrix) chunks of output fields to a memory-mapped
+            copy of table that replaces it """
+        data = numpy.load(table, mmap_mode="r")
+        names = data.dtype.names
+        dtype = data.dtype.descr + [(name, numpy.int64 if name in integer else numpy.float64)
+                                    for name in fields if name not in names]
+        handle, path = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(os.path.abspath(table)))
+        os.close(handle)
+        out = numpy.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=data.shape)
+        start = 0
+        for oids, values in chunks:
+            stop = start + len(oids)
+            rowoids = data[self.oidfield][start:stop] if self.oidfield in names else numpy.arange(start+1, stop+1)
+            if not numpy.array_equal(rowoids, oids):
+                del out
+                os.remove(path)
+                raise ValueError(table+" changed while it was written")
+            for name in names:
+                out[name][start:stop] = data[name][start:stop]
+            for j, name in enumerate(fields):
+                out[name][start:stop] = numpy.round(values[:, j]) if name in integer else values[:, j]
+            start = stop
+        for name in names:
+            out[name][start:] = data[name][start:]
+        out.flush()
+        del out, data
+        os.replace(path, table)
+
+class SQLiteBackend(object):
+    """ reads and writes a table of a SQLite database or GeoPackage; the table is given
+        as a path inside the database, e.g. C:/data/sites.gpkg/parcels """
+
+    def __init__(self, oidfield=OID_FIELD):
+        self.oidfield = oidfield
+
+    def readColumns(self, table, fields):
+        """ returns (oids, matrix) read in one pass over table """
+        database, name = splitDatabasePath(table)
+        with closing(sqlite3.connect(database)) as connection, connection:
+            columns = [row[1] for row in connection.execute("PRAGMA table_info("+quote(name)+")")]
+            oid = self.oidfield if self.oidfield in columns else "rowid"
+            query = "SELECT "+", ".join(quote(c) for c in [oid] + list(fields))+\
+                    " FROM "+quote(name)+" ORDER BY "+quote(oid)
+            rows = connection.execute(query).fetchall()
+        data = numpy.array(rows, dtype=float).reshape(len(rows), len(fields)+1)
+        return data[:, 0].astype(numpy.int64), numpy.ascontiguousarray(data[:, 1:])
+
+    def readColumnChunks(self, table, fields, chunkrows):
+        """ yields (oids, matrix) chunks of at most chunkrows rows of table """
+        database, name = splitDatabasePath(table)
+        with closing(sqlite3.connect(database)) as connection:
+            columns = [row[1] for row in connection.execute("PRAGMA table_info("+quote(name)+")")]
+            oid = self.oidfield if self.oidfield in columns else "rowid"
+            query = "SELECT "+", ".join(quote(c) for c in [oid] + list(fields))+\
+                    " FROM "+quote(name)+" WHERE "+quote(oid)+" > ? ORDER BY "+quote(oid)+" LIMIT ?"
+            last = -2**63
+            while True:
+                rows = connection.execute(query, (last, chunkrows)).fetchall()
+                if not rows:
+                    return
+                data = numpy.array(rows, dtype=float).reshape(len(rows), len(fields)+1)
+                last = rows[-1][0]
+                yield data[:, 0].astype(numpy.int64), numpy.ascontiguousarray(data[:, 1:])
+
+    def stamp(self, table):
+        """ returns (table path, state) of table """
+        database, name = splitDatabasePath(table)
+        with closing(sqlite3.connect(database)) as connection:
+            rowcount = connection.execute("SELECT COUNT(*) FROM "+quote(name)).fetchone()[0]
+        return os.path.abspath(database)+"/"+name, (rowcount, fileStamp(database))
+
+    def writeColumns(self, table, oids, columns):
+        """ writes output columns to the rows of table with the given oids """
+        database, name = splitDatabasePath(table)
+        with closing(sqlite3.connect(database)) as connection, connection:
+            existing = [row[1] for row in connection.execute("PRAGMA table_info("+quote(name)+")")]
+            oid = self.oidfield if self.oidfield in existing else "rowid"
+            for field, values in columns.items():
+                if field not in existing:
+                    sqltype = "INTEGER" if numpy.asarray(values).dtype.kind in "iu" else "REAL"
+                    connection.execute("ALTER TABLE "+quote(name)+" ADD COLUMN "+quote(field)+" "+sqltype)
+            update = "UPDATE "+quote(name)+" SET "+", ".join(quote(f)+" = ?" for f in columns)+\
+                     " WHERE "+quote(oid)+" = ?"
+            rows = zip(*[numpy.asarray(values).tolist() for values in columns.values()],
+                       numpy.asarray(oids).tolist())
+            connection.executemany(update, rows)
+
+    def writeColumnChunks(self, table, fields, chunks, integer=()):
+        """ writes (oids, matrix) chunks of output fields in one transaction """
+        database, name = splitDatabasePath(table)
+        with closing(sqlite3.connect(database)) as connection, connection:
+            existing = [row[1] for row in connection.execute("PRAGMA table_info("+quote(name)+")")]
+            oid = self.oidfield if self.oidfield in existing else "rowid"
+            for field in fields:
+                if field not in existing:
+                    sqltype = "INTEGER" if field in integer else "REAL"
+                    connection.execute("ALTER TABLE "+quote(name)+" ADD COLUMN "+quote(field)+" "+sqltype)
+            update = "UPDATE "+quote(name)+" SET "+", ".join(quote(f)+" = ?" for f in fields)+\
+                     " WHERE "+quote(oid)+" = ?"
+            for oids, values in chunks:
+                connection.executemany(update, [row + [i] for row, i in zip(chunkValues(values, fields, integer), oids.tolist())])
+
+class ChunkSpool(object):
+    """ temporary file of (oids, matrix) chunks, read back memory-mapped; holds
+        the output of a chunked read pass until the table can be written """
+
+    def __init__(self, width):
+        """ in: width number of columns of every chunk (int) """
+        self.dtype = numpy.dtype([("oid", numpy.int64), ("values", numpy.float64, (width,))])
+        handle, self.path = tempfile.mkstemp(suffix=".spool")
+        self.file = open(handle, "wb")
+        self.count = 0
+
+    def append(self, oids, matrix):
+        """ adds a chunk at the end of the spool """
+        records = numpy.empty(len(oids), dtype=self.dtype)
+        records["oid"] = oids
+        records["values"] = matrix
+        records.tofile(self.file)
+        self.count += len(oids)
+
+    def chunks(self, chunkrows):
+        """ yields the spooled rows as (oids, matrix) chunks of at most chunkrows rows """
+        self.file.flush()
+        if self.count == 0:
+            return
+        records = numpy.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.count,))
+        for start in range(0, self.count, chunkrows):
+            chunk = records[start:start+chunkrows]
+            yield numpy.array(chunk["oid"]), numpy.array(chunk["values"])
+        del records
+
+    def close(self):
+        """ deletes the spool file """
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# ----- function definitions -------------------------------------------
+
+def quote(name):
+    """ returns a quoted SQL identifier """
+    return '"'+name.replace('"', '""')+'"'
+
+def splitDatabasePath(table):
+    """ returns (database, table name) of a table path inside a SQLite database """
+    parts = table.replace("\\", "/").split("/")
+    for i, part in enumerate(parts[:-1]):
+        if part.lower().endswith(SQLITE_EXTENSIONS):
+            return "/".join(parts[:i+1]), "/".join(parts[i+1:])
+    raise ValueError(table+" is not a table inside a SQLite database")
+
+def structuredColumns(data, oidfield, fields):
+    """ returns (oids, matrix) from the fields of a structured array """
+    names = data.dtype.names or ()
+    missing = [field for field in fields if field not in names]
+    if missing:
+        raise ValueError("fields not found: "+", ".join(missing))
+    matrix = numpy.empty((len(data), len(fields)), dtype=float)
+    for j, field in enumerate(fields):
+        matrix[:, j] = data[field]
+    if oidfield in names:
+        oids = numpy.asarray(data[oidfield], dtype=numpy.int64)
+    else:
+        oids = numpy.arange(1, len(data)+1, dtype=numpy.int64)
+    return oids, matrix
+
+def chunkValues(values, fields, integer=()):
+    """ returns the rows of a chunk of output fields as lists, the integer
+        fields rounded to int """
+    columns = [numpy.round(values[:, j]).astype(numpy.int64).tolist() if name in integer
+               else values[:, j].tolist() for j, name in enumerate(fields)]
+    return [list(row) for row in zip(*columns)]
+
+def csvValue(text):
+    """ returns the float of a text file value, NaN when empty """
+    return float(text) if text.strip() else numpy.nan
+
+def alignRows(rowoids, oids):
+    """ returns for every table row the position of its oid in oids (-1 if absent) """
+    oids = numpy.asarray(oids)
+    order = numpy.argsort(oids, kind="stable")
+    pos = numpy.searchsorted(oids, rowoids, sorter=order)
+    pos = numpy.minimum(pos, len(oids) - 1)
+    index = order[pos]
+    return numpy.where(oids[index] == rowoids, index, -1)
+
+def arcpyColumn(values):
+    """ returns values as a DOUBLE (float64) or LONG (int32) column """
+    values = numpy.asarray(values)
+    if values.dtype.kind in "iub":
+        return values.astype(numpy.int32)
+    return values.astype(numpy.float64)
+
+def fileStamp(path):
+    """ returns the (size, modification time) of the file holding path, the
+        latest over all files of a file geodatabase, or None if path is not
+        stored in the file system """
+    path = os.path.normpath(path)
+    while path and not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    if not path:
+        return None
+    if os.path.isdir(path):
+        if not path.lower().endswith(".gdb"):
+            return None
+        stats = [os.stat(entry.path) for entry in os.scandir(path) if entry.is_file()]
+        return (sum(st.st_size for st in stats), max([st.st_mtime_ns for st in stats] or [0]))
+    if path.lower().endswith(".shp"):
+        # attributes of a shapefile live in its .dbf
+        dbf = path[:-4]+".dbf"
+        path = dbf if os.path.exists(dbf) else path
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+def getBackend(table):
+    """ returns the backend that reads table, chosen from its path """
+    path = table.lower().replace("\\", "/")
+    if path.endswith(".csv"):
+        return CSVBackend()
+    if path.endswith(".npy"):
+        return NPYBackend()
+    if any(part.endswith(SQLITE_EXTENSIONS) for part in path.split("/")[:-1]):
+        return SQLiteBackend()
+    return ArcpyBackend()
+
+def splitFields(fields):
+    """ returns a list of field names from a list or a ';'-delimited string """
+    if isinstance(fields, str):
+        return [field for field in fields.strip().split(";") if field]
+    return list(fields)
+
+def checkStandardized(matrix, fields):
+    """ raises an error listing every criterion outside the [0.0, 1.0] range """
+    if len(matrix) == 0:
+        raise ValueError("the input table has no rows")
+    inrange = (matrix.min(axis=0) >= 0) & (matrix.max(axis=0) <= 1)
+    if not inrange.all():
+        bad = [field for field, ok in zip(fields, inrange) if not ok]
+        raise ValueError(", ".join(bad)+" is not standardized to [0.0,1.0] range")
+
+def loadStandardizedDecisionMatrix(table, fields, backend=None, cache=None):
+    """
+        in: table path or layer name (string), fields (list or ';'-delimited string),
+            backend reading the table (None picks one from the table path),
+            cache MatrixCache serving repeated loads of an unchanged table (optional)
+        out: (oids, matrix) where
+                    oids is the ObjectID of every row (numpy int64 array)
+                    matrix is the decision matrix (contiguous float64 numpy array,
+                    sites x criteria) of floats in range [0.0, 1.0]
+    """
+    fields = splitFields(fields)
+    if backend is None:
+        backend = getBackend(table)
+    state = None
+    if cache is not None:
+        state = backend.stamp(table)
+        if state is not None:
+            key = cache.key(state[0], fields)
+            cached = cache.get(key, state[1])
+            if cached is not None:
+                return cached
+    oids, matrix = backend.readColumns(table, fields)
+    checkStandardized(matrix, fields)
+    if state is not None:
+        cache.put(key, oids, matrix, state[0], fields, state[1])
+    return oids, matrix
+
+def writeOutputColumns(table, oids, columns, backend=None, cache=None):
+    """
+        in: table path or layer name (string), oids ObjectIDs of the result rows,
+            columns dictionary of output field name -> numpy array aligned with oids,
+            backend writing the table (None picks one from the table path),
+            cache MatrixCache whose entries of table stay valid unless they
+            hold one of the written fields (optional)
+        writes all columns in one pass; missing fields are added
+    """
+    if backend is None:
+        backend = getBackend(table)
+    before = backend.stamp(table) if cache is not None else None
+    backend.writeColumns(table, oids, columns)
+    if before is not None:
+        after = backend.stamp(table)
+        if after is not None:
+            cache.restamp(before[0], before[1], after[1], list(columns))
+
+def readColumnChunks(table, fields, chunkrows, backend=None):
+    """
+        in: table path or layer name (string), fields (list or ';'-delimited string),
+            chunkrows maximum number of rows of a chunk (int),
+            backend reading the table (None picks one from the table path)
+        out: iterator of (oids, matrix) chunks in table order; values are not checked
+    """
+    if backend is None:
+        backend = getBackend(table)
+    return backend.readColumnChunks(table, splitFields(fields), max(1, int(chunkrows)))
+
+def writeColumnChunks(table, fields, chunks, backend=None, cache=None, integer=()):
+    """
+        in: table path or layer name (string), output fields (list),
+            chunks iterator of (oids, matrix) chunks of the output fields, in the
+            order of readColumnChunks,
+            backend writing the table (None picks one from the table path),
+            cache MatrixCache whose entries of table stay valid unless they
+            hold one of the written fields (optional),
+            integer output fields holding whole numbers (list)
+        writes all chunks in one pass; missing fields are added as DOUBLE, or
+        LONG for the integer fields
+    """
+    if backend is None:
+        backend = getBackend(table)
+    fields = splitFields(fields)
+    before = backend.stamp(table) if cache is not None else None
+    backend.writeColumnChunks(table, fields, chunks, integer)
+    if before is not None:
+        after = backend.stamp(table)
+        if after is not None:
+            cache.restamp(before[0], before[1], after[1], fields)
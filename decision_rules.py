@@ -0,0 +1,137 @@
+# Decision rules evaluated for whole blocks of weight vectors at once
+#
+# CRITERIA come as a standardized decision matrix (numpy array, sites x criteria)
+# WEIGHTS come as a weight block (numpy array, runs x criteria), one weight
+# vector per simulation run
+#
+# OUTPUT is a score block (numpy array, runs x sites)
+#
+# RULES: weighted summation and ideal point, registered by name in
+# DECISION_RULES. Every rule is also written as weighted sums of per-criterion
+# terms, sum_j g(w_j)*T[i, j], combined into scores; a change of one weight is
+# then a rank-one update of these sums (used by the Saltelli design)
+#
+# BOUNDED rules (ideal point) compare every site with the best and worst
+# value of every criterion; a matrix scored in row chunks passes the bounds
+# of the whole matrix with every chunk
+#------------- IMPORTS ------------------------------------------------
+import numpy
+
+# number of scores accumulated together, sized to stay in the CPU cache
+CACHE_ELEMENTS = 32768
+
+# ----- function definitions -------------------------------------------
+
+def normalizeWeights(weights, fieldnum):
+    """ checks if the number of weights equals the number of criteria
+        returns (weights, rescaled) where weights are rescaled to add up to
+        1.0 if needed (rescaled is True then) """
+    weights = numpy.array([float(w) for w in weights], dtype=float)
+    if len(weights) != fieldnum:
+        raise ValueError("the number of weights does not match the number of criteria")
+    total = weights.sum()
+    if total <= 0:
+        raise ValueError("weights must add up to a positive number")
+    if total != 1.0:
+        return weights/total, True
+    return weights, False
+
+def weightedSumBlock(matrix, weightblock):
+    """ returns a (runs x sites) array of WEIGHTED SUMMATION scores
+        criteria are accumulated left to right for all runs and sites at once,
+        so every row is bit-identical to the per-site loop of weightedSum """
+    columns = numpy.ascontiguousarray(numpy.transpose(matrix), dtype=float)
+    weightblock = numpy.atleast_2d(numpy.asarray(weightblock, dtype=float))
+    if weightblock.shape[1] != columns.shape[0]:
+        raise ValueError("the number of weights does not match the number of criteria")
+    runs, n = weightblock.shape[0], columns.shape[1]
+    scores = numpy.zeros((runs, n), dtype=float)
+    # a few runs at a time, so the running sums stay in cache
+    step = max(1, CACHE_ELEMENTS//max(n, 1))
+    term = numpy.empty((min(step, runs), n), dtype=float)
+    for start in range(0, runs, step):
+        block = scores[start:start+step]
+        blockterm = term[:block.shape[0]]
+        for j, column in enumerate(columns):
+            numpy.multiply(weightblock[start:start+step, j, None], column[None, :], out=blockterm)
+            block += blockterm
+    return scores
+
+def idealPointBlock(matrix, weightblock, bounds=None):
+    """ returns a (runs x sites) array of IDEAL POINT scores
+        separation from the nadir over the sum of the separations from the
+        ideal and the nadir (best and worst value of every criterion, or the
+        (best, worst) bounds given);
+        criteria are accumulated left to right for all runs and sites at once,
+        as in the per-site loop of idealPoint """
+    matrix = numpy.asarray(matrix, dtype=float)
+    weightblock = numpy.atleast_2d(numpy.asarray(weightblock, dtype=float))
+    if weightblock.shape[1] != matrix.shape[1]:
+        raise ValueError("the number of weights does not match the number of criteria")
+    best, worst = bounds if bounds is not None else (matrix.max(axis=0), matrix.min(axis=0))
+    fromideal = numpy.ascontiguousarray(numpy.transpose(matrix - best))
+    fromnadir = numpy.ascontiguousarray(numpy.transpose(matrix - worst))
+    runs, n = weightblock.shape[0], matrix.shape[0]
+    separideal = numpy.zeros((runs, n), dtype=float)
+    separnadir = numpy.zeros((runs, n), dtype=float)
+    # a few runs at a time, so the running sums stay in cache
+    step = max(1, CACHE_ELEMENTS//max(n, 1))
+    term = numpy.empty((min(step, runs), n), dtype=float)
+    for start in range(0, runs, step):
+        for separ, deviations in ((separideal, fromideal), (separnadir, fromnadir)):
+            block = separ[start:start+step]
+            blockterm = term[:block.shape[0]]
+            for j, column in enumerate(deviations):
+                numpy.multiply(weightblock[start:start+step, j, None], column[None, :], out=blockterm)
+                blockterm *= blockterm
+                block += blockterm
+    return separationScores(separideal, separnadir)
+
+def separationScores(separideal, separnadir):
+    """ returns ideal point scores from the squared separations; sites at
+        both the ideal and the nadir (all weighted criteria constant) score 0.5 """
+    separideal = numpy.sqrt(separideal)
+    separnadir = numpy.sqrt(separnadir)
+    total = separideal + separnadir
+    scores = numpy.full(total.shape, 0.5)
+    numpy.divide(separnadir, total, out=scores, where=total > 0)
+    return scores
+
+def getDecisionRule(name):
+    """ returns the decision rule registered under name (see DECISION_RULES) """
+    try:
+        return DECISION_RULES[name or "weighted_sum"]
+    except KeyError:
+        raise ValueError("unknown decision rule "+str(name)+"; use one of "+", ".join(DECISION_RULES))
+
+# ----- class definitions ----------------------------------------------
+
+class WeightedSum(object):
+    """ WEIGHTED SUMMATION decision rule """
+    bounded = False
+    def __call__(self, matrix, weightblock, bounds=None):
+        return weightedSumBlock(matrix, weightblock)
+    def terms(self, matrix):
+        """ returns the (sites x criteria) term matrices the weights multiply """
+        return [numpy.asarray(matrix, dtype=float)]
+    def transform(self, weightblock):
+        """ returns the weights as they multiply the terms """
+        return weightblock
+    def combine(self, sums):
+        """ returns scores from the weighted sums of every term matrix """
+        return sums[0]
+
+class IdealPoint(object):
+    """ IDEAL POINT decision rule """
+    bounded = True
+    def __call__(self, matrix, weightblock, bounds=None):
+        return idealPointBlock(matrix, weightblock, bounds)
+    def terms(self, matrix):
+        matrix = numpy.asarray(matrix, dtype=float)
+        return [(matrix - matrix.max(axis=0))**2, (matrix - matrix.min(axis=0))**2]
+    def transform(self, weightblock):
+        return weightblock**2
+    def combine(self, sums):
+        return separationScores(sums[0], sums[1])
+
+DECISION_RULES = {"weighted_sum": WeightedSum(), "ideal_point": IdealPoint()}
@@ -0,0 +1,460 @@
+# Estimations of first order, total order effects
+# First order and total order indices are estimated according to the rule proposed in
+# Saltelli, A., P. Annoni, I. Azzini, F. Campolongo, M. Ratto, S. Tarantola, (2010)
+#   Variance based sensitivity analysis of model output.
+#   Design and estimator for the total sensitivity index", Computer Physics Communications, 181, 259-270
+# Total cost = N(k+2)
+#
+# Vectorized version of first_total_seq_WS.py: the (N x k) sample matrices A
+# and B and the (k x N x k) radial block A_B^j are generated at once, all
+# N(k+2) weighted sums are evaluated as score blocks (chunked over the base
+# samples to fit in memory) and S/ST are computed once at the end.
+# For the same samples, ties="legacy" and incremental=False the indices are
+# identical to the original estimator.
+#
+# INCREMENTAL scoring: A_B^j differs from A in weight j only, so its weighted
+# sums are scores(A) + (B_j - A_j)*X[:, j]; only A and B are scored against
+# the whole matrix and the k radial blocks are one column update each (for
+# the ideal point the same holds for the squared separations, with squared
+# weights). The updated scores agree with a full rescoring up to rounding.
+#
+# Function WEIGHTED SUMMATION (or any rule of decision_rules.DECISION_RULES),
+# weights as factors, criteria as constants
+#
+# SEVERAL OPTIONS (the winner and any tracked options) are ranked in one
+# pass: the model output of every run is then the (runs x m) block of their
+# ranks, counted without a sort, and S/ST are estimated for every column
+# from the same samples; in adaptive mode the widest interval of all
+# options decides when to stop
+#
+# PARALLEL mode splits the N base samples into fixed-size chunks, each with
+# its own random stream derived from the seed, and evaluates them on a
+# process pool; the per-chunk numerator sums and variance statistics are
+# merged in chunk order, so results for a seed do not depend on the number
+# of workers
+#
+# SAMPLERS: A and B can also come from a scrambled Sobol' sequence or a Latin
+# hypercube over 2k dimensions (see samplers.py); A takes the even and B the
+# odd dimensions, and parallel chunks read consecutive blocks of one design
+#
+# CONFIDENCE intervals of S and ST come from a Poisson bootstrap over the
+# base samples, accumulated chunk by chunk from the chunk's own random stream
+# ADAPTIVE mode evaluates batches of N base samples until the half-width of
+# every interval is below a tolerance or a maximum number of base samples
+# is reached
+#
+# APPROXIMATE ranking: with a maximum rank error the average shift in ranks
+# of every run comes from histogram ranks (see ranking.histogramRankBlock),
+# so it is within that error of the exact one; the winner and tracked ranks
+# are counted without a sort anyway and stay exact
+#------------- IMPORTS ------------------------------------------------
+import os, sys, random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+
+from decision_rules import weightedSumBlock, getDecisionRule
+from ranking import rankBlock, trackedRanks, averageShiftRanksBlock, histogramRankBlock
+from montecarlo import checkWeightBounds, getBlockSize
+from accumulators import RunningStatistics, BootstrapTotals
+from samplers import getSampler, scaleSamples, PseudoRandomSampler, SobolSampler, LatinHypercubeSampler
+
+# number of base samples sharing one random stream in parallel mode
+CHUNK_SAMPLES = 1000
+
+# bootstrap replicates used by the adaptive mode when none are given
+DEFAULT_BOOTSTRAP = 200
+
+# ----- function definitions -------------------------------------------
+
+class AverageShiftRanks(object):
+    """ model output: average shift in ranks from the equal weight ranks,
+        from approximate ranks within rankerror if given """
+    def __init__(self, equalranks, ties="ordinal", rankerror=None):
+        self.equalranks = equalranks
+        self.ties = ties
+        self.rankerror = rankerror
+    def __call__(self, scores):
+        if self.rankerror is not None:
+            return averageShiftRanksBlock(self.equalranks, histogramRankBlock(scores, self.rankerror, self.ties)[0])
+        return averageShiftRanksBlock(self.equalranks, rankBlock(scores, self.ties))
+
+class WinnerRank(object):
+    """ model output: rank of the selected option, or a (runs x m) block of
+        the ranks of the options of an index array """
+    def __init__(self, bestIndex, ties="ordinal"):
+        self.bestIndex = bestIndex
+        self.ties = ties
+    def __call__(self, scores):
+        ranks = trackedRanks(scores, numpy.atleast_1d(self.bestIndex), self.ties).astype(float)
+        return ranks[:, 0] if numpy.ndim(self.bestIndex) == 0 else ranks
+
+def drawSaltelliSamples(mins, maxes, N, rng=random):
+    """ returns the independent (N x k) sample matrices (A, B) drawn from the
+        uniform weight ranges; rng is a numpy Generator, a sampler of 2k
+        dimensions (see samplers.py) or a random-style generator consumed in
+        the same order as the original per-sample loop (A[j], B[j] for every
+        factor j) """
+    k = len(mins)
+    if isinstance(rng, numpy.random.Generator):
+        draws = rng.random((N, k, 2))
+    elif isinstance(rng, (PseudoRandomSampler, SobolSampler, LatinHypercubeSampler)):
+        draws = rng.draw(N).reshape(N, k, 2)
+    else:
+        draws = numpy.array([rng.random() for i in range(N*k*2)], dtype=float).reshape(N, k, 2)
+    A = scaleSamples(draws[:, :, 0], mins, maxes)
+    B = scaleSamples(draws[:, :, 1], mins, maxes)
+    return A, B
+
+def radialSamples(A, B):
+    """ returns the (k x N x k) radial block, where A_B^j is A with
+        column j taken from B (e.g. table 3 p. 262 in the paper above) """
+    N, k = A.shape
+    AB = numpy.repeat(A[None, :, :], k, axis=0)
+    cols = numpy.arange(k)
+    AB[cols, :, cols] = B.T
+    return AB
+
+def getEqualWeightRanks(matrix, ties="ordinal", rule="weighted_sum"):
+    """ returns ranks for the equal weight case """
+    k = matrix.shape[1]
+    if rule != "weighted_sum":
+        return rankBlock(getDecisionRule(rule)(matrix, [numpy.full(k, 1.0/k)]), ties)[0]
+    # criteria summed left to right as in sum()
+    total = matrix[:, 0].copy()
+    for j in range(1, k):
+        total += matrix[:, j]
+    return rankBlock(total/float(k), ties)[0]
+
+def outputArrays(N, k, shape=()):
+    """ returns empty (yA, yB, yAB) arrays of N base samples, k factors and
+        model outputs of the given shape per run """
+    return (numpy.empty((N,) + shape, dtype=float), numpy.empty((N,) + shape, dtype=float),
+            numpy.empty((N, k) + shape, dtype=float))
+
+def evaluateSaltelli(matrix, A, B, output, blocksize=None, incremental=True, rule="weighted_sum"):
+    """
+        in: decision matrix (numpy array, sites x criteria),
+            sample matrices A and B (numpy arrays, N x k),
+            output function mapping a (runs x sites) score block to a vector of
+            model outputs (e.g. the average shift in ranks of every run),
+            blocksize number of base samples evaluated at once (int, None adapts to memory),
+            incremental scores A_B^j by updating the scores of A (bool),
+            rule decision rule scoring the sites (see decision_rules.DECISION_RULES)
+        out: (yA, yB, yAB) model outputs for A (N), B (N) and A_B^j (N x k),
+             with a trailing axis of m outputs if output returns (runs x m) blocks
+    """
+    matrix = numpy.asarray(matrix, dtype=float)
+    rule = getDecisionRule(rule)
+    N, k = A.shape
+    if blocksize is None:
+        # scores held at once per base sample: A, B and A_B^j (all of them
+        # unless incremental)
+        rows = 2 if incremental else k+2
+        blocksize = max(1, getBlockSize(matrix.shape[0], k, N*rows)//rows)
+    yA = yB = yAB = None
+    if incremental:
+        terms = rule.terms(matrix)
+        columns = [numpy.ascontiguousarray(numpy.transpose(term)) for term in terms]
+    for start in range(0, N, blocksize):
+        stop = min(N, start + blocksize)
+        c = stop - start
+        if incremental:
+            tA = rule.transform(A[start:stop])
+            tB = rule.transform(B[start:stop])
+            sums = [weightedSumBlock(term, numpy.concatenate([tA, tB])) for term in terms]
+            y = output(rule.combine(sums))
+            if yA is None:
+                yA, yB, yAB = outputArrays(N, k, y.shape[1:])
+            yA[start:stop] = y[:c]
+            yB[start:stop] = y[c:]
+            sumsA = [block[:c] for block in sums]
+            # the B sums are no longer needed, their rows are reused
+            sumsAB = [block[c:] for block in sums]
+            for j in range(k):
+                for blockA, blockAB, termcolumns in zip(sumsA, sumsAB, columns):
+                    numpy.multiply((tB[:, j] - tA[:, j])[:, None], termcolumns[j][None, :], out=blockAB)
+                    blockAB += blockA
+                yAB[start:stop, j] = output(rule.combine(sumsAB))
+            continue
+        # rows: A chunk, B chunk, then A_B^1 .. A_B^k chunks
+        samples = numpy.concatenate([A[start:stop], B[start:stop],
+                                     radialSamples(A[start:stop], B[start:stop]).reshape(k*c, k)])
+        y = output(rule(matrix, samples))
+        if yA is None:
+            yA, yB, yAB = outputArrays(N, k, y.shape[1:])
+        yA[start:stop] = y[:c]
+        yB[start:stop] = y[c:2*c]
+        yAB[start:stop] = y[2*c:].reshape((k, c) + y.shape[1:]).swapaxes(0, 1)
+    return yA, yB, yAB
+
+def sensitivityIndices(yA, yB, yAB):
+    """
+        in: model outputs for A (N), B (N) and A_B^j (N x k), or for m
+            outputs A (N x m), B (N x m) and A_B^j (N x k x m)
+        out: (S,ST) where
+                    S is an array of first order indices (k, or k x m)
+                    ST is an array of total indices (k, or k x m)
+    """
+    if yA.ndim == 2:
+        # every output on its own
+        indices = [sensitivityIndices(yA[:, i], yB[:, i], yAB[:, :, i]) for i in range(yA.shape[1])]
+        return (numpy.column_stack([S for S, ST in indices]),
+                numpy.column_stack([ST for S, ST in indices]))
+    k = yAB.shape[1]
+    # total variance over all A and B outputs
+    Vtot = numpy.column_stack([yA, yB]).ravel().var()
+    # nominators for first and totals
+    Vi = yB[:, None]*(yAB - yA[:, None])
+    VT = (yA[:, None] - yAB)**2
+    S = numpy.empty((k), float)
+    ST = numpy.empty((k), float)
+    for j in range(k):
+        S[j] = numpy.mean(Vi[:, j])/Vtot
+        ST[j] = numpy.mean(VT[:, j])/2/Vtot
+    return S, ST
+
+def first_total_asr(minweights, maxweights, dtable, N, rng=random, blocksize=None, ties="ordinal", incremental=True, rule="weighted_sum", rankerror=None):
+    """
+        in: minimum for weight ranges (list),  maximum for weight ranges (list),
+            decision matrix (numpy array), N number of base samples (int),
+            ties method for tied scores (see ranking.TIE_METHODS),
+            incremental scoring of the radial samples (bool),
+            rule decision rule scoring the sites (see decision_rules.DECISION_RULES),
+            rankerror maximum error of approximate ranks (float, None ranks exactly)
+        out: (ASR,(S,ST)) where
+                    ASR average shift in ranks for sample A (uncertainty analysis)
+                    S is an array of first order indices for ASR
+                    ST is an array of total indices for ASR
+    """
+    dtable = numpy.asarray(dtable, dtype=float)
+    mins, maxes = checkWeightBounds(minweights, maxweights, dtable.shape[1])
+    A, B = drawSaltelliSamples(mins, maxes, int(N), rng)
+    equalranks = getEqualWeightRanks(dtable, ties, rule)
+    output = AverageShiftRanks(equalranks, ties, rankerror)
+    yA, yB, yAB = evaluateSaltelli(dtable, A, B, output, blocksize, incremental, rule)
+    return (yA, sensitivityIndices(yA, yB, yAB))
+
+def first_total_best(minweights, maxweights, dtable, N, bestIndex, rng=random, blocksize=None, ties="ordinal", incremental=True, rule="weighted_sum"):
+    """
+        in: minimum for weight ranges (list),  maximum for weight ranges (list),
+            decision matrix (numpy array), N number of base samples (int),
+            bestIndex row index of the selected option (int),
+            ties method for tied scores (see ranking.TIE_METHODS),
+            incremental scoring of the radial samples (bool),
+            rule decision rule scoring the sites (see decision_rules.DECISION_RULES)
+        out: (RankSeq,(S,ST)) where
+                    RankSeq is the rank of the best option in each run of sample A
+                    S is an array of first order indices for the winner rank
+                    ST is an array of total indices for the winner rank
+    """
+    dtable = numpy.asarray(dtable, dtype=float)
+    mins, maxes = checkWeightBounds(minweights, maxweights, dtable.shape[1])
+    A, B = drawSaltelliSamples(mins, maxes, int(N), rng)
+    output = WinnerRank(bestIndex, ties)
+    yA, yB, yAB = evaluateSaltelli(dtable, A, B, output, blocksize, incremental, rule)
+    return (yA, sensitivityIndices(yA, yB, yAB))
+
+def saltelliChunk(matrix, chunkseed, count, mins, maxes, output, blocksize=None, incremental=True, start=0, bootstrap=0, rule="weighted_sum", sampler=None):
+    """ evaluates one chunk of base samples drawn from its own random stream,
+        or the samples start .. start+count-1 of sampler if given
+        returns (yA, yBstats, Vistats, VTstats, boot) where the statistics are
+        RunningStatistics of the A and B outputs and of the nominators and
+        boot the BootstrapTotals of the per-sample terms (None without
+        bootstrap replicates) """
+    if sampler is None:
+        A, B = drawSaltelliSamples(mins, maxes, count, numpy.random.default_rng(chunkseed))
+    else:
+        draws = sampler.block(start, count).reshape(count, len(mins), 2)
+        A = scaleSamples(draws[:, :, 0], mins, maxes)
+        B = scaleSamples(draws[:, :, 1], mins, maxes)
+    yA, yB, yAB = evaluateSaltelli(matrix, A, B, output, blocksize, incremental, rule)
+    # m model outputs per run; the statistics of output i of factor j are
+    # in column j*m + i
+    m = 1 if yA.ndim == 1 else yA.shape[1]
+    Vi = yB[:, None]*(yAB - yA[:, None])
+    VT = (yA[:, None] - yAB)**2
+    Vi = Vi.reshape(count, -1)
+    VT = VT.reshape(count, -1)
+    ystats = RunningStatistics(m).update(numpy.stack([yA, yB], axis=1).reshape(-1, m))
+    Vistats = RunningStatistics(Vi.shape[1]).update(Vi)
+    VTstats = RunningStatistics(VT.shape[1]).update(VT)
+    boot = None
+    if bootstrap:
+        terms = numpy.column_stack([(yA + yB).reshape(count, m), (yA**2 + yB**2).reshape(count, m), Vi, VT])
+        boot = BootstrapTotals(bootstrap, terms.shape[1]).update(terms, numpy.random.default_rng(chunkseed.spawn(1)[0]))
+    return yA, ystats, Vistats, VTstats, boot
+
+def bootstrapIntervals(boot, k, confidence=0.95, m=None):
+    """ returns ((Slow, Shigh), (STlow, SThigh)) percentile intervals of the
+        indices from the bootstrap replicates of the per-sample terms, each
+        (k x m) for m model outputs per run (k for a single output, m None) """
+    width = 1 if m is None else m
+    means = boot.means()
+    replicates = means.shape[0]
+    # variance of the 2N outputs from the means of yA+yB and yA**2+yB**2
+    Vtot = means[:, width:2*width]/2 - (means[:, :width]/2)**2
+    terms = means[:, 2*width:].reshape(replicates, 2, k, width)
+    S = terms[:, 0]/Vtot[:, None, :]
+    ST = terms[:, 1]/2/Vtot[:, None, :]
+    q = [(1 - confidence)/2*100, (1 + confidence)/2*100]
+    Slow, Shigh = numpy.percentile(S, q, axis=0)
+    STlow, SThigh = numpy.percentile(ST, q, axis=0)
+    if m is None:
+        return (Slow[:, 0], Shigh[:, 0]), (STlow[:, 0], SThigh[:, 0])
+    return (Slow, Shigh), (STlow, SThigh)
+
+_workerMatrix = None
+_workerSampler = None
+
+def _initWorker(matrix, sampler=None):
+    """ keeps the decision matrix and the sampler in the worker process """
+    global _workerMatrix, _workerSampler
+    _workerMatrix = matrix
+    _workerSampler = sampler
+
+def _workerChunk(args):
+    return saltelliChunk(_workerMatrix, *args, sampler=_workerSampler)
+
+def processPool(workers, initializer=None, initargs=()):
+    """ returns a process pool that also works inside ArcGIS Pro, where
+        sys.executable is the application rather than python """
+    context = multiprocessing.get_context("spawn")
+    if not os.path.basename(sys.executable).lower().startswith("python"):
+        context.set_executable(os.path.join(sys.exec_prefix, "pythonw.exe" if sys.platform == "win32" else "python"))
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                               initializer=initializer, initargs=initargs)
+
+def first_total_parallel(minweights, maxweights, dtable, N, bestIndex=None, seed=None, workers=None, progress=None, ties="ordinal", incremental=True, sampler="random",
+                         bootstrap=0, confidence=0.95, tolerance=None, maxN=None, rule="weighted_sum", rankerror=None):
+    """
+        in: minimum for weight ranges (list),  maximum for weight ranges (list),
+            decision matrix (numpy array), N number of base samples (int, the
+            batch size in adaptive mode),
+            bestIndex row index of the selected option (int, None for ASR),
+            or row indices of several options ranked in the same pass (list),
+            seed of the random streams (int), workers number of processes
+            (int, None for all cores), progress optional callback progress(done, N),
+            ties method for tied scores (see ranking.TIE_METHODS),
+            incremental scoring of the radial samples (bool),
+            sampler of A and B (see samplers.SAMPLERS),
+            bootstrap number of bootstrap replicates for confidence intervals
+            (int, 0 for none), confidence level of the intervals (float),
+            tolerance of the interval half-widths that stops the adaptive
+            mode (float, None runs N base samples only),
+            maxN maximum number of base samples in adaptive mode (int),
+            rule decision rule scoring the sites (see decision_rules.DECISION_RULES),
+            rankerror maximum error of the approximate ranks of the average
+            shift in ranks (float, None ranks exactly)
+        out: (Y,(S,ST),CI) where
+                    Y is the model output for each run of sample A
+                    S is an array of first order indices
+                    ST is an array of total indices
+                    CI is ((Slow, Shigh), (STlow, SThigh)), None without bootstrap
+             with an index list, Y is (N x m) and S, ST and the intervals
+             are (k x m), column i for option bestIndex[i]
+    """
+    dtable = numpy.ascontiguousarray(dtable, dtype=float)
+    n, k = dtable.shape
+    mins, maxes = checkWeightBounds(minweights, maxweights, k)
+    getDecisionRule(rule)
+    N = int(N)
+    workers = workers or os.cpu_count() or 1
+    if tolerance is not None:
+        bootstrap = bootstrap or DEFAULT_BOOTSTRAP
+        limit = max(N, int(maxN or 10*N))
+    else:
+        limit = N
+    # number of model outputs per run, None for a single one
+    m = None if bestIndex is None or numpy.ndim(bestIndex) == 0 else len(bestIndex)
+    if bestIndex is None:
+        output = AverageShiftRanks(getEqualWeightRanks(dtable, ties, rule), ties, rankerror)
+    else:
+        output = WinnerRank(bestIndex if m is None else numpy.asarray(bestIndex, dtype=numpy.intp), ties)
+    width = 1 if m is None else m
+    # one random stream (or block of the sampler design) per chunk, whatever
+    # the number of workers
+    root = numpy.random.SeedSequence(seed)
+    sampler = None if sampler in (None, "random") else getSampler(sampler, 2*k, limit, seed)
+    blocksize = max(1, getBlockSize(n, k, N*(k+2), 0.25/workers)//(k+2))
+    pool = None
+    if workers > 1 and limit > CHUNK_SAMPLES:
+        pool = processPool(workers, _initWorker, (dtable, sampler))
+    Y = []
+    ystats = RunningStatistics(width)
+    Vistats = RunningStatistics(k*width)
+    VTstats = RunningStatistics(k*width)
+    boot = BootstrapTotals(bootstrap, (2 + 2*k)*width) if bootstrap else None
+    CI = None
+    try:
+        done = 0
+        while done < limit:
+            batch = min(N, limit - done)
+            starts = list(range(done, done + batch, CHUNK_SAMPLES))
+            counts = [min(CHUNK_SAMPLES, done + batch - start) for start in starts]
+            seeds = root.spawn(len(counts))
+            tasks = [(seeds[c], counts[c], mins, maxes, output, blocksize, incremental, starts[c], bootstrap, rule)
+                     for c in range(len(counts))]
+            if pool is None:
+                results = (saltelliChunk(dtable, *task, sampler=sampler) for task in tasks)
+            else:
+                results = pool.map(_workerChunk, tasks)
+            # merge in chunk order
+            for yA, ychunk, Vichunk, VTchunk, bootchunk in results:
+                Y.append(yA)
+                ystats.merge(ychunk)
+                Vistats.merge(Vichunk)
+                VTstats.merge(VTchunk)
+                if boot is not None:
+                    boot.merge(bootchunk)
+                if progress is not None:
+                    progress(Vistats.count, limit)
+            done += batch
+            if boot is not None:
+                CI = bootstrapIntervals(boot, k, confidence, m)
+            if tolerance is None:
+                break
+            halfwidth = max(numpy.max(hi - lo) for lo, hi in CI)/2
+            if halfwidth <= tolerance:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    Vtot = ystats.var()
+    S = Vistats.mean().reshape(k, width)/Vtot
+    ST = VTstats.mean().reshape(k, width)/2/Vtot
+    if m is None:
+        S, ST = S[:, 0], ST[:, 0]
+    return (numpy.concatenate(Y), (S, ST), CI)
+
+def outputColumn(result, i):
+    """ returns the (Y,(S,ST),CI) result of option i from the result of
+        first_total_parallel for a list of options """
+    Y, (S, ST), CI = result
+    if CI is not None:
+        CI = tuple((lo[:, i], hi[:, i]) for lo, hi in CI)
+    return (Y[:, i], (S[:, i], ST[:, i]), CI)
+
+def formatIndices(title, field_names, indices, intervals=None, confidence=0.95):
+    """ returns the S/ST report section of one GSA output, with the
+        confidence intervals ((Slow, Shigh), (STlow, SThigh)) if given """
+    S, ST = indices
+    result = title+"\nFactor\tS\tST\n"
+    for j in range(len(field_names)):
+        result += field_names[j]+"\t"+str(round(S[j], 3))+"\t"+str(round(ST[j], 3))+"\n"
+    result += "\n\nFactor\t%S\t%ST\n"
+    Ssum = sum(S)
+    STsum = sum(ST)
+    for j in range(len(field_names)):
+        result += field_names[j]+"\t"+str(round(S[j]*100, 1))+\
+                  "\t"+str(round((ST[j]/STsum)*100, 1))+"\n"
+    result += "NONL\t"+str(round((1-Ssum)*100, 1))+"\n"
+    if intervals is not None:
+        (Slow, Shigh), (STlow, SThigh) = intervals
+        level = "%g" % (confidence*100)
+        result += "\n\nFactor\tS "+level+"% CI\tST "+level+"% CI\n"
+        for j in range(len(field_names)):
+            result += field_names[j]+"\t["+str(round(Slow[j], 3))+", "+str(round(Shigh[j], 3))+"]"+\
+                      "\t["+str(round(STlow[j], 3))+", "+str(round(SThigh[j], 3))+"]\n"
+    result += "\n\n"
+    return result
@@ -0,0 +1,164 @@
+# Persistent on-disk cache of loaded decision matrices
+#
+# Matrices are stored as .npy files (read back memory-mapped) keyed by the
+# dataset path and the field list, and are only served while the row count
+# and modification stamp of the dataset match the ones recorded with them,
+# so an edited table is never served from the cache.
+# Least recently used entries are evicted when the cache grows over its
+# disk budget; entries can also be invalidated explicitly.
+#
+# The cache directory and budget default to the TH4_MATRIX_CACHE and
+# TH4_MATRIX_CACHE_MB environment variables
+#------------- IMPORTS ------------------------------------------------
+import os, json, glob, hashlib, tempfile
+import numpy
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), "th4_matrix_cache")
+DEFAULT_BUDGET_MB = 2048
+
+# ----- class definitions ----------------------------------------------
+
+class MatrixCache(object):
+    """ LRU cache of (oids, matrix) pairs under a disk budget """
+
+    def __init__(self, directory=None, budget=None):
+        """
+            in: directory holding the cache files (string),
+                budget maximum size of the cache on disk in bytes (int)
+        """
+        self.directory = directory or os.environ.get("TH4_MATRIX_CACHE", DEFAULT_DIRECTORY)
+        if budget is None:
+            budget = int(float(os.environ.get("TH4_MATRIX_CACHE_MB", DEFAULT_BUDGET_MB))*1024**2)
+        self.budget = int(budget)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, table, fields):
+        """ returns the cache key of a field list of table """
+        text = json.dumps([os.path.normcase(table), list(fields)])
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _path(self, key, part):
+        return os.path.join(self.directory, key+part)
+
+    def _info(self, key):
+        try:
+            with open(self._path(key, ".json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, key, stamp):
+        """ returns the memory-mapped (oids, matrix) stored under key if it
+            was stored for the same stamp (row count, modification stamp, ...),
+            otherwise None """
+        info = self._info(key)
+        if info is None or info.get("stamp") != jsonValue(stamp):
+            return None
+        try:
+            oids = numpy.load(self._path(key, ".oid.npy"), mmap_mode="r")
+            matrix = numpy.load(self._path(key, ".npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        # the modification time of the entry records its last use
+        os.utime(self._path(key, ".json"))
+        return oids, matrix
+
+    def put(self, key, oids, matrix, table, fields, stamp):
+        """ stores (oids, matrix) under key and evicts old entries over budget """
+        try:
+            for part, array in ((".oid.npy", oids), (".npy", matrix)):
+                temp = self._path(key, ".tmp"+part)
+                numpy.save(temp, numpy.ascontiguousarray(array))
+                os.replace(temp, self._path(key, part))
+        except OSError:
+            # e.g. the old entry is still memory-mapped on Windows
+            self.remove(key)
+            return
+        self._writeInfo(key, {"table": table, "fields": list(fields), "stamp": jsonValue(stamp)})
+        self.evict(keep=key)
+
+    def _writeInfo(self, key, info):
+        temp = self._path(key, ".tmp.json")
+        with open(temp, "w") as f:
+            json.dump(info, f)
+        os.replace(temp, self._path(key, ".json"))
+
+    def restamp(self, table, oldstamp, newstamp, changedfields):
+        """ keeps the entries of table stored for oldstamp valid for newstamp,
+            unless they hold one of changedfields; used after the toolbox itself
+            wrote output fields to the table, which changes its stamp but not
+            the criteria """
+        changed = set(f.upper() for f in changedfields)
+        for key, (used, size, entrytable) in self.entries().items():
+            if entrytable is None or os.path.normcase(entrytable) != os.path.normcase(table):
+                continue
+            info = self._info(key)
+            if info is None or info.get("stamp") != jsonValue(oldstamp):
+                continue
+            if changed.intersection(f.upper() for f in info["fields"]):
+                self.remove(key)
+            else:
+                info["stamp"] = jsonValue(newstamp)
+                self._writeInfo(key, info)
+
+    def entries(self):
+        """ returns {key: (last use, size in bytes, table)} of all entries """
+        entries = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            key = os.path.basename(path)[:-len(".json")]
+            if key.endswith(".tmp"):
+                continue
+            try:
+                with open(path) as f:
+                    table = json.load(f).get("table")
+                files = [self._path(key, part) for part in (".npy", ".oid.npy", ".json")]
+                size = sum(os.path.getsize(p) for p in files if os.path.exists(p))
+                entries[key] = (os.path.getmtime(path), size, table)
+            except (OSError, ValueError):
+                entries[key] = (0, 0, None)
+        return entries
+
+    def remove(self, key):
+        """ deletes the files of one entry """
+        for part in (".npy", ".oid.npy", ".json"):
+            try:
+                os.remove(self._path(key, part))
+            except OSError:
+                pass
+
+    def evict(self, keep=None):
+        """ removes least recently used entries until the cache fits its budget """
+        entries = self.entries()
+        total = sum(size for used, size, table in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k][0]):
+            if total <= self.budget:
+                break
+            if key != keep:
+                self.remove(key)
+                total -= entries[key][1]
+
+    def invalidate(self, table=None):
+        """ removes the entries of table, or every entry if table is None
+            returns the number of removed entries """
+        removed = 0
+        for key, (used, size, entrytable) in self.entries().items():
+            if table is None or (entrytable is not None and
+                                 os.path.normcase(entrytable) == os.path.normcase(table)):
+                self.remove(key)
+                removed += 1
+        return removed
+
+# ----- function definitions -------------------------------------------
+
+def jsonValue(value):
+    """ returns value as it reads back from JSON (tuples become lists) """
+    return json.loads(json.dumps(value, default=str))
+
+_defaultCache = None
+
+def defaultCache():
+    """ returns the cache shared by the toolbox tools """
+    global _defaultCache
+    if _defaultCache is None:
+        _defaultCache = MatrixCache()
+    return _defaultCache
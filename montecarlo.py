@@ -0,0 +1,272 @@
+# Batched Monte Carlo Simulation of option scoring and ranking
+# Using the WEIGHTED SUMMATION (or IDEAL POINT) decision rule and variable weights
+#
+# WEIGHTS are randomly drawn from a uniform distribution with MIN and MAX
+# given by the user, then rescaled so that they add-up to 1.0
+# The draws come from a sampler (see samplers.py): pseudo-random as in the
+# original script, or a scrambled Sobol' sequence or Latin hypercube, which
+# cover the weight ranges more evenly for the same number of runs
+# Weights are drawn as (runs x criteria) blocks, scored against the decision
+# matrix in one pass and ranked block by block; the block size adapts to the
+# memory available on the machine
+#
+# Summary statistics are streamed block by block (see accumulators.py), so
+# memory does not grow with the number of runs
+#
+# For a fixed seed and ties="legacy" the results are identical to the
+# original MonteCarloWeightedSum.py run with random.seed(seed) (rank StdDev
+# up to floating point rounding); the other tie methods only differ from it
+# when sites have tied scores
+#
+# TRACKED sites: when a set of site indices is given, only those sites are
+# ranked (by counting better scores, see ranking.trackedRanks) and the rank
+# statistics cover only them, which avoids sorting every run
+#
+# CONVERGENCE: with a tolerance, the runs are done in smaller blocks and the
+# simulation stops as soon as the largest standard error of the mean rank
+# and of the rank StdDev (over all sites, or over the tracked sites) is
+# below the tolerance; the number of runs done is the count of the statistics
+#
+# APPROXIMATE ranking: with a maximum rank error, every run is ranked from
+# a histogram of its scores in O(n) instead of a sort (see
+# ranking.histogramRankBlock); the largest error of all runs is reported
+#
+# RANK ACCEPTABILITY: a RankAcceptability accumulator (see accumulators.py)
+# can be given to count the runs of every site at every rank, or in a sparse
+# table at the best K ranks; writeAcceptability saves its nonzero shares as
+# a side table
+#
+# WINNING INDICES: a WinningIndex accumulator counts, for the tracked sites
+# (or all sites), how often every site outscores every other one; the
+# CONSENSUS ranking orders them by their pairwise majorities (Copeland
+# score: pairs won by more than half of the runs, half a point for even
+# pairs), ties broken by the sum of the winning indices. A site winning
+# every pair is the Condorcet winner
+#
+# OUTPUT: Average Score; Average Rank; Min Rank; Max Rank; StdDev of Ranks
+#------------- IMPORTS ------------------------------------------------
+import os, sys, random
+import numpy
+
+from decision_rules import getDecisionRule
+from ranking import rankBlock, rankDtype, trackedRanks, histogramRankBlock
+from accumulators import RunningStatistics, RankAcceptability
+from samplers import PseudoRandomSampler, getSampler, scaleSamples
+
+# number of convergence checks over the maximum number of runs
+CONVERGENCE_CHECKS = 50
+# runs done before the first convergence check
+CONVERGENCE_MIN_RUNS = 100
+
+# largest number of ranks counted in a dense rank acceptability table
+DENSE_ACCEPTABILITY_RANKS = 2000
+
+# ----- function definitions -------------------------------------------
+
+def availableMemory():
+    """ returns the number of bytes of physical memory currently available """
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong),
+                            ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong),
+                            ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong),
+                            ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong),
+                            ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullAvailPhys
+        return os.sysconf("SC_AVPHYS_PAGES")*os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return 512*1024**2
+
+def getBlockSize(n, k, N, memfraction=0.25):
+    """ returns the number of runs to process at once, so that the score,
+        sort and rank arrays of one block use at most memfraction of the
+        available memory """
+    # scores + temporary term + argsort indices + ranks for every site, plus weights
+    perrun = n*(8 + 8 + 8 + rankDtype(n).itemsize) + k*8*2
+    runs = int(availableMemory()*memfraction)//perrun
+    return max(1, min(int(N), runs))
+
+def checkWeightBounds(minweights, maxweights, fieldnum):
+    """ checks if the number of weights equals the number of criteria
+        checks if min_weight <= max_weight
+        returns (mins, maxes) as numpy arrays """
+    mins = numpy.array([float(w) for w in minweights], dtype=float)
+    maxes = numpy.array([float(w) for w in maxweights], dtype=float)
+    if len(mins) != fieldnum:
+        raise ValueError("the number of MIN weights does not match the number of criteria")
+    if len(maxes) != fieldnum:
+        raise ValueError("the number of MAX weights does not match the number of criteria")
+    if numpy.any(maxes - mins < 0):
+        raise ValueError("MAX values for weights cannot be smaller than MIN values for weights")
+    return mins, maxes
+
+def drawWeightBlock(mins, maxes, runs, sampler=None):
+    """ draws a (runs x criteria) block of weights from the input uniform
+        distribution, every row rescaled to add up to 1.0
+        sampler defaults to the random module, consumed in the same order as
+        by drawWeights run after run """
+    k = len(mins)
+    if sampler is None:
+        sampler = PseudoRandomSampler(k, rng=random)
+    raw_weights = scaleSamples(sampler.draw(runs), mins, maxes)
+    # rescale to [0,1]; criteria summed left to right as in sum()
+    total = raw_weights[:, 0].copy()
+    for j in range(1, k):
+        total += raw_weights[:, j]
+    return raw_weights/total[:, None]
+
+def rankStandardError(rankstats):
+    """ returns the largest standard error of the mean ranks and rank StdDevs """
+    return max(rankstats.stdError().max(), rankstats.stdStdError().max())
+
+def monteCarloStatistics(matrix, minweights, maxweights, N, seed=None, blocksize=None, progress=None, quantilebins=0, ties="ordinal", tracked=None, sampler="random",
+                         tolerance=None, rule="weighted_sum", rankerror=None, acceptability=None, winning=None):
+    """
+        in: decision matrix (numpy array, sites x criteria),
+            minimum for weight ranges (list), maximum for weight ranges (list),
+            N number of simulation runs (int), seed of the random generator (int),
+            blocksize number of runs scored at once (int, None adapts to memory),
+            progress optional callback progress(runs_done, N),
+            quantilebins number of histogram bins of the rank quantile sketch (int),
+            ties method for tied scores (see ranking.TIE_METHODS),
+            tracked row indices of the only sites to rank (list, None ranks all),
+            sampler of the weights (see samplers.SAMPLERS),
+            tolerance of the rank standard errors that stops the simulation
+            before N runs (float, None runs all N),
+            rule decision rule scoring the sites (see decision_rules.DECISION_RULES),
+            rankerror maximum error of approximate ranks (float, None ranks exactly),
+            acceptability RankAcceptability updated with the ranks of every
+            block (see getAcceptability, None to skip),
+            winning WinningIndex updated with the scores of the tracked sites
+            (or all sites) of every block (None to skip)
+        out: (scorestats, rankstats) RunningStatistics of scores and ranks
+             (rankstats in the order of tracked if given); their count is the
+             number of runs done; with approximate ranks rankstats.rankerror
+             is the largest rank error of all runs
+    """
+    matrix = numpy.asarray(matrix, dtype=float)
+    rows, k = matrix.shape
+    mins, maxes = checkWeightBounds(minweights, maxweights, k)
+    rule = getDecisionRule(rule)
+    N = int(N)
+    if N < 1:
+        raise ValueError("the number of simulation runs must be at least 1")
+    if blocksize is None:
+        blocksize = getBlockSize(rows, k, N)
+    if tolerance is not None:
+        blocksize = min(blocksize, max(CONVERGENCE_MIN_RUNS, N//CONVERGENCE_CHECKS))
+    sampler = getSampler(sampler, k, N, seed)
+
+    scorestats = RunningStatistics(rows)
+    if tracked is not None:
+        tracked = numpy.atleast_1d(numpy.asarray(tracked, dtype=numpy.intp))
+    ranked = rows if tracked is None else len(tracked)
+    rankstats = RunningStatistics(ranked, bins=quantilebins, lo=0.5, hi=rows+0.5,
+                                  moments=tolerance is not None)
+    if rankerror is not None:
+        rankstats.rankerror = 0.0
+    if acceptability is not None:
+        if rankerror is not None or ties == "average":
+            raise ValueError("rank acceptability needs exact integer ranks; use another tie method and no rank error")
+        if acceptability.n != ranked:
+            raise ValueError("the rank acceptability table does not match the number of ranked sites")
+    if winning is not None and winning.m != ranked:
+        raise ValueError("the winning index matrix does not match the number of ranked sites")
+    done = 0
+    while done < N:
+        runs = min(blocksize, N - done)
+        weights = drawWeightBlock(mins, maxes, runs, sampler)
+        scores = rule(matrix, weights)
+        if rankerror is not None:
+            ranks, errors = histogramRankBlock(scores, rankerror, ties)
+            rankstats.rankerror = max(rankstats.rankerror, errors.max())
+            if tracked is not None:
+                ranks = ranks[:, tracked]
+        elif tracked is None:
+            ranks = rankBlock(scores, ties)
+        else:
+            ranks = trackedRanks(scores, tracked, ties)
+        # update data for summary stats
+        scorestats.update(scores)
+        rankstats.update(ranks)
+        if acceptability is not None:
+            acceptability.update(ranks)
+        if winning is not None:
+            winning.update(scores if tracked is None else scores[:, tracked])
+        done += runs
+        if progress is not None:
+            progress(done, N)
+        if tolerance is not None and done >= CONVERGENCE_MIN_RUNS and rankStandardError(rankstats) <= tolerance:
+            break
+    return scorestats, rankstats
+
+def monteCarloWeightedSum(matrix, minweights, maxweights, N, seed=None, blocksize=None, progress=None, ties="ordinal", tracked=None, sampler="random", rule="weighted_sum",
+                          rankerror=None):
+    """
+        in: see monteCarloStatistics
+        out: (avgscores, avgranks, minranks, maxranks, stdranks) numpy arrays
+             (rank arrays in the order of tracked if given)
+    """
+    scorestats, rankstats = monteCarloStatistics(matrix, minweights, maxweights, N,
+                                                 seed, blocksize, progress, ties=ties,
+                                                 tracked=tracked, sampler=sampler, rule=rule, rankerror=rankerror)
+    return (scorestats.mean(), rankstats.mean(), rankstats.minimum,
+            rankstats.maximum, rankstats.std())
+
+def getAcceptability(n, ranked=None, topk=10):
+    """ returns a RankAcceptability of the ranked sites (int, None for all n
+        sites) among n sites: dense up to DENSE_ACCEPTABILITY_RANKS ranks,
+        otherwise a sparse table of the ranks 1..topk only """
+    ranked = n if ranked is None else ranked
+    return RankAcceptability(ranked, n, None if n <= DENSE_ACCEPTABILITY_RANKS else topk)
+
+def writeAcceptability(path, oids, acceptability):
+    """ writes the nonzero rank acceptability indices as a CSV side table
+        with one OID, RANK, RUNS, ACCEPTABILITY row per site and rank """
+    sites, ranks, counts = acceptability.nonzero()
+    with open(path, "w") as f:
+        f.write("OID,RANK,RUNS,ACCEPTABILITY\n")
+        for oid, rank, count in zip(numpy.asarray(oids)[sites].tolist(), (ranks + 1).tolist(), counts.tolist()):
+            f.write(str(oid)+","+str(rank)+","+str(count)+","+repr(count/float(acceptability.count))+"\n")
+    return len(sites)
+
+def consensusRanking(winning):
+    """ returns (ranks, copeland, condorcet) of the sites of an (m x m)
+        winning index matrix: the consensus ranks (1 is the best), the
+        Copeland scores and the index of the Condorcet winner (None if no
+        site wins every pair) """
+    winning = numpy.asarray(winning, dtype=float)
+    m = len(winning)
+    offdiagonal = ~numpy.eye(m, dtype=bool)
+    copeland = ((winning > 0.5) & offdiagonal).sum(axis=1) + 0.5*((winning == 0.5) & offdiagonal).sum(axis=1)
+    strength = numpy.where(offdiagonal, winning, 0.0).sum(axis=1)
+    order = numpy.lexsort((-strength, -copeland))
+    ranks = numpy.empty(m, dtype=numpy.int64)
+    ranks[order] = numpy.arange(1, m+1)
+    winners = numpy.flatnonzero(((winning > 0.5) | ~offdiagonal).all(axis=1))
+    condorcet = int(winners[0]) if len(winners) and m > 1 else None
+    return ranks, copeland, condorcet
+
+def writeWinningIndices(path, oids, winning):
+    """ writes the (m x m) winning index matrix as a CSV table, one row and
+        one column per site, row i column j the share of the runs in which
+        site i outscores site j """
+    oids = numpy.asarray(oids).tolist()
+    with open(path, "w") as f:
+        f.write("OID,"+",".join("OID_"+str(oid) for oid in oids)+"\n")
+        for oid, row in zip(oids, numpy.asarray(winning).tolist()):
+            f.write(str(oid)+","+",".join(repr(value) for value in row)+"\n")
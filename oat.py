@@ -0,0 +1,123 @@
+# One-at-a-time (OAT) comparison of option ranks for many scenarios at once
+#
+# SCENARIOS are alternative weight vectors compared to a base weight vector:
+# given reference vectors, or a SWEEP where every weight is perturbed by
+# +-steps (fractions of the weight) and the vector renormalized to add up to
+# 1.0. The base and all scenarios are scored as one weight block and ranked
+# together
+#
+# CRITERIA scenarios replace one or more criteria (columns) of the base
+# decision matrix by alternative versions; every rule is a weighted sum of
+# per-column terms, so a scenario is scored as the base sums plus the
+# weighted term changes of its columns, for all scenarios in one product
+#
+# OUTPUT per scenario: average shift in ranks (ASR) from the base ranks, the
+# largest rank change and the number of sites changing rank; for a sweep
+# also tornado data (ASR of the largest decrease and increase of every weight)
+#------------- IMPORTS ------------------------------------------------
+import numpy
+
+from decision_rules import normalizeWeights, getDecisionRule, weightedSumBlock
+from ranking import rankBlock, averageShiftRanksBlock
+
+# ----- function definitions -------------------------------------------
+
+def parseWeightVector(text, fieldnum):
+    """ returns (weights, rescaled) of a weight vector given as a space or
+        comma delimited string, e.g. "0.5 0.3 0.2" for 3 criteria """
+    values = text.replace(",", " ").split()
+    try:
+        return normalizeWeights(values, fieldnum)
+    except ValueError as err:
+        raise ValueError(str(err)+": "+text)
+
+def sweepScenarios(baseweights, steps, field_names):
+    """ returns (labels, weightblock) of the sweep scenarios: every weight
+        perturbed by each step (e.g. -0.1 for -10%) and the vector rescaled to
+        add up to 1.0 """
+    base = numpy.asarray(baseweights, dtype=float)
+    if min(steps) <= -1.0:
+        raise ValueError("sweep steps must be above -100%")
+    labels = []
+    block = []
+    for j, field in enumerate(field_names):
+        for step in sorted(steps):
+            weights = base.copy()
+            weights[j] *= 1.0 + step
+            total = weights.sum()
+            labels.append(field+" "+("%+g" % (step*100))+"%")
+            block.append(weights/total)
+    return labels, numpy.array(block).reshape(-1, len(base))
+
+def scenarioRanks(matrix, baseweights, weightblock, ties="ordinal", rule="weighted_sum"):
+    """ returns (scores, ranks) of the base (row 0) and every scenario
+        (rows 1..), scored as one block """
+    weights = numpy.vstack([numpy.asarray(baseweights, dtype=float)[None, :],
+                            numpy.atleast_2d(numpy.asarray(weightblock, dtype=float))])
+    scores = getDecisionRule(rule)(matrix, weights)
+    return scores, rankBlock(scores, ties)
+
+def alternativeRanks(matrix, weights, altcolumns, scenarios, ties="ordinal", rule="weighted_sum"):
+    """
+        in: base decision matrix (numpy array, sites x criteria), weights (list),
+            alternative criteria (numpy array, sites x alternatives),
+            scenarios list of the changes of every scenario, each a list of
+            (criterion index, alternative index) pairs,
+            ties method for tied scores (see ranking.TIE_METHODS),
+            rule decision rule scoring the sites (see decision_rules.DECISION_RULES)
+        out: (scores, ranks) of the base (row 0) and every scenario (rows 1..)
+    """
+    rule = getDecisionRule(rule)
+    weights = rule.transform(numpy.asarray(weights, dtype=float)[None, :])[0]
+    changes = sorted(set(change for scenario in scenarios for change in scenario))
+    criteria = numpy.array([j for j, a in changes], dtype=numpy.intp)
+    alternatives = numpy.array([a for j, a in changes], dtype=numpy.intp)
+    # which changes every scenario is made of
+    membership = numpy.zeros((len(changes), len(scenarios)), dtype=float)
+    for s, scenario in enumerate(scenarios):
+        for change in scenario:
+            membership[changes.index(change), s] = 1.0
+    sums = []
+    for term, altterm in zip(rule.terms(matrix), rule.terms(altcolumns)):
+        base = weightedSumBlock(term, [weights])
+        delta = weights[criteria]*(altterm[:, alternatives] - term[:, criteria])
+        sums.append(numpy.vstack([base, base + (delta @ membership).T]))
+    scores = rule.combine(sums)
+    return scores, rankBlock(scores, ties)
+
+def scenarioShifts(ranks):
+    """ returns (asr, maxshift, moved) of every scenario (rows 1.. of ranks)
+        against the base ranks (row 0) """
+    asr = averageShiftRanksBlock(ranks[0], ranks[1:])
+    shifts = numpy.abs(ranks[1:].astype(float) - ranks[0].astype(float))
+    return asr, shifts.max(axis=1), (shifts > 0).sum(axis=1)
+
+def tornadoData(field_names, steps, asr):
+    """ returns [(field, ASR of the largest decrease, ASR of the largest
+        increase)] of a sweep, ordered by the larger of the two, from the asr
+        of the scenarios of sweepScenarios """
+    steps = sorted(steps)
+    rows = []
+    for j, field in enumerate(field_names):
+        fieldasr = asr[j*len(steps):(j+1)*len(steps)]
+        low = fieldasr[0] if steps[0] < 0 else 0.0
+        high = fieldasr[-1] if steps[-1] > 0 else 0.0
+        rows.append((field, float(low), float(high)))
+    return sorted(rows, key=lambda row: -max(row[1], row[2]))
+
+def formatScenarios(labels, asr, maxshift, moved):
+    """ returns the ASR table of the scenarios """
+    result = "Scenario\tName\tASR\tMax Shift\tSites Moved\n"
+    for i, label in enumerate(labels):
+        result += str(i+1)+"\t"+label+"\t"+str(round(asr[i], 3))+"\t"+\
+                  "%g" % maxshift[i]+"\t"+str(int(moved[i]))+"\n"
+    return result
+
+def formatTornado(rows, steps):
+    """ returns the tornado data of a sweep """
+    low = "%+g%%" % (min(steps)*100)
+    high = "%+g%%" % (max(steps)*100)
+    result = "Factor\tASR "+low+"\tASR "+high+"\n"
+    for field, lowasr, highasr in rows:
+        result += field+"\t"+str(round(lowasr, 3))+"\t"+str(round(highasr, 3))+"\n"
+    return result
@@ -0,0 +1,210 @@
+# Out-of-core scoring and ranking of site tables larger than memory
+#
+# The decision matrix is read in ROW CHUNKS (see decision_matrix.py) and
+# every chunk is scored with the decision rule on its own; bounded rules
+# (ideal point) first get the best and worst value of every criterion from
+# an extra pass over the table
+#
+# RANKS come from an external merge sort: every scored chunk is sorted and
+# spilled to a memory-mapped temporary file (a sorted RUN); the runs are then
+# merged k-way, a buffer of every run at a time, into the global order from
+# the best to the worst score, and the rank of every site is written to a
+# memory-mapped rank array in table order. Ties are handled as by
+# ranking.rankBlock, the position of a site in the table standing in for its
+# index
+#
+# The scores and ranks are written back in one streaming pass. Chunks, merge
+# buffers and write chunks are sized from a memory BUDGET, so peak memory
+# does not grow with the number of sites
+#------------- IMPORTS ------------------------------------------------
+import os, shutil, tempfile
+import numpy
+
+from decision_matrix import getBackend, splitFields, checkStandardized, readColumnChunks, writeColumnChunks, ChunkSpool
+from decision_rules import getDecisionRule
+from ranking import TIE_METHODS, rankDtype
+from standardize import columnRanges
+
+DEFAULT_BUDGET_MB = 256
+
+# sort record of a run: negated score, then the tie key (position in the
+# table, negated for legacy ties)
+RUN_DTYPE = numpy.dtype([("key", numpy.float64), ("tie", numpy.int64)])
+
+# ----- function definitions -------------------------------------------
+
+def getChunkRows(k, budget):
+    """ returns the number of rows scored at once within budget bytes: the
+        criteria, the scores, the sort keys and order of every row """
+    perrow = 8*k*2 + 8*6
+    return max(1, int(budget)//perrow)
+
+def scoreChunks(table, fields, weights, rule, chunkrows, backend=None):
+    """ yields (oids, scores) of every row chunk of table """
+    rule = getDecisionRule(rule)
+    bounds = None
+    if rule.bounded:
+        # best and worst value of every criterion over the whole table
+        mins = maxes = None
+        for oids, matrix in readColumnChunks(table, fields, chunkrows, backend):
+            mins, maxes = columnRanges(matrix, mins, maxes)
+        if mins is not None:
+            bounds = (maxes, mins)
+    for oids, matrix in readColumnChunks(table, fields, chunkrows, backend):
+        checkStandardized(matrix, fields)
+        yield oids, rule(matrix, [weights], bounds)[0]
+
+def sortedRun(scores, start, ties="ordinal"):
+    """ returns the RUN_DTYPE records of the scores of the sites at positions
+        start.. sorted from the best to the worst """
+    run = numpy.empty(len(scores), dtype=RUN_DTYPE)
+    run["key"] = -numpy.asarray(scores, dtype=float)
+    positions = numpy.arange(start, start+len(scores), dtype=numpy.int64)
+    run["tie"] = -positions if ties == "legacy" else positions
+    return run[numpy.lexsort((run["tie"], run["key"]))]
+
+def mergeRuns(runs, buffer):
+    """ yields the records of the sorted runs in global order, in batches:
+        a buffer of every run is read and the records up to the smallest last
+        record of the buffers of unfinished runs are sorted and emitted """
+    cursors = [0]*len(runs)
+    while True:
+        active = [i for i, run in enumerate(runs) if cursors[i] < len(run)]
+        if not active:
+            return
+        blocks = [runs[i][cursors[i]:cursors[i]+buffer] for i in active]
+        bound = None
+        for i, block in zip(active, blocks):
+            if cursors[i] + len(block) < len(runs[i]):
+                last = (block["key"][-1], block["tie"][-1])
+                if bound is None or last < bound:
+                    bound = last
+        taken = []
+        for i, block in zip(active, blocks):
+            if bound is None:
+                count = len(block)
+            else:
+                # records are sorted, so the ones up to the bound are a prefix
+                below = (block["key"] < bound[0]) | ((block["key"] == bound[0]) & (block["tie"] <= bound[1]))
+                count = int(below.sum())
+            cursors[i] += count
+            taken.append(block[:count])
+        merged = numpy.concatenate(taken)
+        yield merged[numpy.lexsort((merged["tie"], merged["key"]))]
+
+def mergeRanks(batches, ranks, order, ties="ordinal"):
+    """ writes the rank of every site to ranks (indexed by position) from
+        the merged batches of records; order receives the positions in
+        sorted order (both numpy arrays or memmaps of n elements) """
+    done = 0
+    groupstart = 0
+    dense = 0
+    lastkey = None
+    for batch in batches:
+        size = len(batch)
+        positions = -batch["tie"] if ties == "legacy" else batch["tie"]
+        index = numpy.arange(done, done+size, dtype=numpy.int64)
+        order[done:done+size] = positions
+        if ties in ("ordinal", "legacy"):
+            ranks[positions] = index + 1
+            done += size
+            continue
+        keys = batch["key"]
+        newgroup = numpy.empty(size, dtype=bool)
+        newgroup[0] = lastkey is None or keys[0] != lastkey
+        newgroup[1:] = keys[1:] != keys[:-1]
+        starts = numpy.maximum.accumulate(numpy.where(newgroup, index, groupstart))
+        if ties == "min":
+            ranks[positions] = starts + 1
+        elif ties == "dense":
+            ranks[positions] = dense + numpy.cumsum(newgroup)
+            dense += int(newgroup.sum())
+        else:
+            # average: a group is done once the next one starts; groups
+            # continuing from earlier batches are completed through order
+            newstarts = index[newgroup]
+            if len(newstarts) and newstarts[0] > groupstart:
+                ranks[order[groupstart:newstarts[0]]] = (groupstart + 1 + newstarts[0])/2.0
+            # end of every group started in this batch, -1 while it is open
+            groupid = numpy.cumsum(newgroup) - 1
+            ends = numpy.append(newstarts[1:], -1)
+            end = numpy.full(size, -1, dtype=numpy.int64)
+            end[groupid >= 0] = ends[groupid[groupid >= 0]]
+            finished = end >= 0
+            ranks[positions[finished]] = (starts[finished] + 1 + end[finished])/2.0
+        if newgroup.any():
+            groupstart = int(starts[-1])
+        lastkey = keys[-1]
+        done += size
+    if ties == "average" and done > groupstart:
+        ranks[order[groupstart:done]] = (groupstart + 1 + done)/2.0
+
+def outOfCoreScoreAndRank(table, fields, weights, scorefield, rankfield, rule="weighted_sum", ties="ordinal",
+                          budget=None, backend=None, cache=None, progress=None):
+    """
+        in: table path or layer name (string), fields (list or ';'-delimited string),
+            weights (list, rescaled to add up to 1.0),
+            scorefield and rankfield names of the output fields (string),
+            rule decision rule scoring the sites (see decision_rules.DECISION_RULES),
+            ties method for tied scores (see ranking.TIE_METHODS),
+            budget memory for the chunks and merge buffers in bytes (int,
+            None uses DEFAULT_BUDGET_MB),
+            backend reading and writing the table (None picks one from the table path),
+            cache MatrixCache kept valid for the unchanged fields (optional),
+            progress optional callback progress(message)
+        out: number of sites scored and ranked
+        writes the scores and ranks of all sites to table in one pass
+    """
+    if ties not in TIE_METHODS + ("legacy",):
+        raise ValueError("unknown tie method "+str(ties)+"; use one of "+", ".join(TIE_METHODS))
+    fields = splitFields(fields)
+    if backend is None:
+        backend = getBackend(table)
+    if budget is None:
+        budget = DEFAULT_BUDGET_MB*1024**2
+    chunkrows = getChunkRows(len(fields), budget)
+    weights = numpy.asarray(weights, dtype=float)
+    if len(weights) != len(fields):
+        raise ValueError("the number of weights does not match the number of criteria")
+
+    directory = tempfile.mkdtemp(prefix="th4_runs_")
+    try:
+        # [1] score the chunks, spill sorted runs and keep the scores in table order
+        with ChunkSpool(1) as spool:
+            runs = []
+            n = 0
+            for oids, scores in scoreChunks(table, fields, weights, rule, chunkrows, backend):
+                path = os.path.join(directory, "run"+str(len(runs))+".npy")
+                numpy.save(path, sortedRun(scores, n, ties))
+                runs.append(path)
+                spool.append(oids, scores[:, None])
+                n += len(scores)
+            if n == 0:
+                raise ValueError("the input table has no rows")
+            if progress is not None:
+                progress(str(n)+" sites scored in "+str(len(runs))+" sorted runs")
+
+            # [2] k-way merge of the runs into ranks by table position
+            runs = [numpy.load(path, mmap_mode="r") for path in runs]
+            dtype = numpy.float64 if ties == "average" else rankDtype(n, ties)
+            ranks = numpy.lib.format.open_memmap(os.path.join(directory, "ranks.npy"), mode="w+", dtype=dtype, shape=(n,))
+            order = numpy.lib.format.open_memmap(os.path.join(directory, "order.npy"), mode="w+", dtype=numpy.int64, shape=(n,))
+            buffer = max(1, budget//(len(runs)*RUN_DTYPE.itemsize*4))
+            mergeRanks(mergeRuns(runs, buffer), ranks, order, ties)
+            if progress is not None:
+                progress(str(len(runs))+" sorted runs merged")
+
+            # [3] one streaming pass writing the scores and ranks
+            def chunks(ranks):
+                start = 0
+                for oids, scores in spool.chunks(chunkrows):
+                    stop = start + len(oids)
+                    yield oids, numpy.column_stack([scores[:, 0], ranks[start:stop]])
+                    start = stop
+            # average tie ranks keep their halves in a DOUBLE field
+            integer = [] if ties == "average" else [rankfield]
+            writeColumnChunks(table, [scorefield, rankfield], chunks(ranks), backend, cache, integer=integer)
+            del runs, ranks, order
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return n
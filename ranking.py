@@ -0,0 +1,190 @@
+# Ranking of option scores for whole blocks of simulation runs
+#
+# SCORES come as a score block (numpy array, runs x sites); the best
+# (highest) score gets rank 1. Ties are handled by an explicit method:
+#   ordinal - distinct ranks, tied sites ranked in site order
+#   min     - tied sites share the best rank of the group (1, 2, 2, 4)
+#   dense   - tied sites share a rank, no gaps after groups (1, 2, 2, 3)
+#   average - tied sites share the mean rank of the group (1, 2.5, 2.5, 4)
+#   legacy  - distinct ranks in the order of the original getRank
+#             (tied sites ranked from the last one)
+# Integer ranks use the smallest unsigned dtype that holds n
+#
+# TRACKED sites (e.g. a shortlist of candidate sites) can be ranked without
+# sorting: the rank of a site is one plus the number of sites scoring
+# strictly higher (plus its share of tied sites), a linear count that is
+# done for all runs at once as a single comparison
+#
+# APPROXIMATE ranks (histogramRankBlock) avoid the O(n log n) sort for very
+# large n: the scores of every run are counted into a fine histogram in
+# O(n) and a site gets the middle rank of its bin, the number of sites in
+# higher bins plus half of its own bin. The exact rank (ordinal, min,
+# average or legacy) lies within the bin, so the error is at most
+# (bin count - 1)/2; bins holding more sites than a maximum error allows
+# are ranked exactly, so the error bound is guaranteed. Percentile ranks
+# are 100*rank/n with an error of 100*error/n
+#------------- IMPORTS ------------------------------------------------
+import numpy
+
+TIE_METHODS = ("ordinal", "min", "dense", "average")
+
+# number of site comparisons held in memory at once by trackedRanks
+COMPARE_ELEMENTS = 2**22
+
+# fewest histogram bins of the approximate ranks
+MIN_RANK_BINS = 256
+
+# ----- function definitions -------------------------------------------
+
+def rankDtype(n, ties="ordinal"):
+    """ returns the smallest dtype that holds ranks 1..n for the tie method """
+    if ties == "average":
+        # halves are exact in float32 up to 2**23
+        return numpy.dtype(numpy.float32 if n < 2**23 else numpy.float64)
+    for dtype in (numpy.uint8, numpy.uint16, numpy.uint32):
+        if n <= numpy.iinfo(dtype).max:
+            return numpy.dtype(dtype)
+    return numpy.dtype(numpy.uint64)
+
+def sortDescending(scoreblock, ties="ordinal"):
+    """ returns (order, sortedscores): per run, the site indices from the best
+        to the worst score and the scores in that order """
+    if ties == "legacy":
+        # stable ascending sort reversed, as in the original getRank
+        order = numpy.argsort(scoreblock, axis=1)
+        sortedscores = numpy.take_along_axis(scoreblock, order, axis=1)
+        tied = (sortedscores[:, 1:] == sortedscores[:, :-1]).any(axis=1)
+        if tied.any():
+            order[tied] = numpy.argsort(scoreblock[tied], axis=1, kind="stable")
+        order = order[:, ::-1]
+        return order, numpy.take_along_axis(scoreblock, order, axis=1)
+    negated = -scoreblock
+    order = numpy.argsort(negated, axis=1)
+    sortedscores = -numpy.take_along_axis(negated, order, axis=1)
+    if ties == "ordinal":
+        # the fast unstable sort is only redone with a stable one for runs
+        # that contain tied scores
+        tied = (sortedscores[:, 1:] == sortedscores[:, :-1]).any(axis=1)
+        if tied.any():
+            order[tied] = numpy.argsort(negated[tied], axis=1, kind="stable")
+    return order, sortedscores
+
+def rankBlock(scoreblock, ties="ordinal"):
+    """ returns a (runs x sites) array of ranks based on input scores,
+        ties handled by one of TIE_METHODS (or "legacy") """
+    if ties not in TIE_METHODS + ("legacy",):
+        raise ValueError("unknown tie method "+str(ties)+"; use one of "+", ".join(TIE_METHODS))
+    scoreblock = numpy.atleast_2d(scoreblock)
+    runs, n = scoreblock.shape
+    dtype = rankDtype(n, ties)
+    order, sortedscores = sortDescending(scoreblock, ties)
+    positions = numpy.arange(1, n+1, dtype=dtype)
+    if ties in ("ordinal", "legacy"):
+        sortedranks = numpy.broadcast_to(positions, (runs, n))
+    else:
+        # first and last sorted position of every group of tied scores
+        newgroup = numpy.ones((runs, n), dtype=bool)
+        newgroup[:, 1:] = sortedscores[:, 1:] != sortedscores[:, :-1]
+        if ties == "dense":
+            sortedranks = numpy.cumsum(newgroup, axis=1, dtype=dtype)
+        else:
+            first = numpy.maximum.accumulate(numpy.where(newgroup, positions, 0), axis=1).astype(dtype)
+            if ties == "min":
+                sortedranks = first
+            else:
+                lastingroup = numpy.ones((runs, n), dtype=bool)
+                lastingroup[:, :-1] = newgroup[:, 1:]
+                last = numpy.minimum.accumulate(numpy.where(lastingroup, positions, n+1)[:, ::-1], axis=1)[:, ::-1]
+                sortedranks = (first + last.astype(dtype))/dtype.type(2)
+    ranks = numpy.empty((runs, n), dtype=dtype)
+    numpy.put_along_axis(ranks, order, sortedranks, axis=1)
+    return ranks
+
+def trackedRanks(scoreblock, tracked, ties="ordinal"):
+    """ returns a (runs x m) array of the ranks of the tracked sites (site
+        indices) in every run, equal to rankBlock(scoreblock, ties)[:, tracked]
+        but computed by counting better scores in O(n) instead of sorting """
+    scoreblock = numpy.atleast_2d(scoreblock)
+    tracked = numpy.atleast_1d(numpy.asarray(tracked, dtype=numpy.intp))
+    runs, n = scoreblock.shape
+    if ties == "dense":
+        # dense ranks count distinct better scores, which needs a sort
+        return rankBlock(scoreblock, ties)[:, tracked]
+    if ties not in TIE_METHODS + ("legacy",):
+        raise ValueError("unknown tie method "+str(ties)+"; use one of "+", ".join(TIE_METHODS))
+    m = len(tracked)
+    ranks = numpy.empty((runs, m), dtype=rankDtype(n, ties))
+    sites = numpy.arange(n)
+    if ties == "ordinal":
+        # tied sites listed before the tracked one rank better
+        tiebreak = sites[None, :] < tracked[:, None]
+    elif ties == "legacy":
+        tiebreak = sites[None, :] > tracked[:, None]
+    step = max(1, COMPARE_ELEMENTS//max(n*m, 1))
+    for start in range(0, runs, step):
+        block = scoreblock[start:start+step]
+        own = block[:, tracked][:, :, None]
+        rank = 1 + (block[:, None, :] > own).sum(axis=2)
+        if ties == "average":
+            rank = rank + ((block[:, None, :] == own).sum(axis=2) - 1)/2.0
+        elif ties != "min":
+            rank += ((block[:, None, :] == own) & tiebreak[None, :, :]).sum(axis=2)
+        ranks[start:start+step] = rank
+    return ranks
+
+def histogramBins(n, maxerror):
+    """ returns the number of histogram bins that hold about maxerror sites
+        each for n evenly spread scores """
+    return int(min(max(n, 1), max(MIN_RANK_BINS, 2*n//(2*int(maxerror) + 1))))
+
+def histogramRankBlock(scoreblock, maxerror, ties="ordinal", bins=None):
+    """ returns (ranks, errors): a (runs x sites) float array of approximate
+        ranks from a histogram of the scores of every run and the largest
+        rank error of every run, at most maxerror (ranks); bins number of
+        histogram bins (int, None sizes them from maxerror) """
+    if ties == "dense":
+        raise ValueError("dense ranks cannot be approximated; use another tie method")
+    if ties not in TIE_METHODS + ("legacy",):
+        raise ValueError("unknown tie method "+str(ties)+"; use one of "+", ".join(TIE_METHODS))
+    if maxerror < 0:
+        raise ValueError("the maximum rank error must be 0 or more")
+    scoreblock = numpy.atleast_2d(numpy.asarray(scoreblock, dtype=float))
+    runs, n = scoreblock.shape
+    if bins is None:
+        bins = histogramBins(n, maxerror)
+    lo = scoreblock.min(axis=1, keepdims=True)
+    span = scoreblock.max(axis=1, keepdims=True) - lo
+    scale = numpy.divide(bins, span, out=numpy.zeros_like(span), where=span > 0)
+    # bin of every score, bin 0 holding the lowest scores
+    binidx = ((scoreblock - lo)*scale).astype(numpy.intp)
+    numpy.minimum(binidx, bins - 1, out=binidx)
+    offsets = numpy.arange(runs, dtype=numpy.intp)[:, None]*bins
+    counts = numpy.bincount((binidx + offsets).ravel(), minlength=runs*bins).reshape(runs, bins)
+    above = n - numpy.cumsum(counts, axis=1)
+    own = numpy.take_along_axis(counts, binidx, axis=1)
+    ranks = numpy.take_along_axis(above, binidx, axis=1) + (own + 1)/2.0
+    # bins too full for the error bound are ranked exactly: the rank among
+    # their sites less the sites of fuller bins above
+    heavy = counts > 2*maxerror + 1
+    for run in numpy.flatnonzero(heavy.any(axis=1)):
+        members = numpy.flatnonzero(heavy[run][binidx[run]])
+        heavycounts = numpy.where(heavy[run], counts[run], 0)
+        heavyabove = heavycounts.sum() - numpy.cumsum(heavycounts)
+        memberbins = binidx[run, members]
+        ranks[run, members] = above[run, memberbins] - heavyabove[memberbins] + \
+                              rankBlock(scoreblock[run, members], ties)[0]
+    errors = numpy.maximum(numpy.where(heavy, 0, counts).max(axis=1) - 1, 0)/2.0
+    return ranks, errors
+
+def getRankBlock(scoreblock):
+    """ returns a (runs x sites) array of ranks based on input scores
+        every row equals getRank of the corresponding row of scores """
+    return rankBlock(scoreblock, "legacy")
+
+def averageShiftRanksBlock(baseranks, rankblock):
+    """ returns the average shift in ranks between the base scenario
+        and every run (row) of the rank block """
+    n = len(baseranks)
+    base = numpy.asarray(baseranks, dtype=float)
+    abs_shift = numpy.abs(rankblock.astype(float) - base)
+    return abs_shift.sum(axis=1)/float(n)
@@ -0,0 +1,153 @@
+# Cell-wise multicriteria scoring of a stack of criterion rasters
+#
+# Every CELL of k aligned criterion rasters (same size, cell size and
+# corner, see rasters.sameGrid) is a site and its k band values are its
+# criteria; the decision rule (see decision_rules.DECISION_RULES) scores all
+# cells into one composite SCORE raster of the grid of the first band
+#
+# The grid is processed TILE by TILE: the window of the tile is read from all
+# k bands, the cells with a value in every band are scored at once as a
+# (cells x k) decision matrix and the scores are written to the same window
+# of the output raster; cells with NoData in any band stay NoData. Bounded
+# rules (ideal point) first get the best and worst value of every band from
+# an extra pass over the tiles, so scores do not depend on the tiling
+#
+# PARALLEL mode scores the tiles on a process pool (see gsa.processPool);
+# every worker opens the bands itself and only tile windows and scores move
+# between the processes. Tiles are written in order by the main process
+#
+# The bands must be standardized to the 0.0 - 1.0 range, as the fields of
+# the vector tools
+#------------- IMPORTS ------------------------------------------------
+import os
+import numpy
+
+from decision_rules import getDecisionRule, normalizeWeights
+from gsa import processPool
+from rasters import getRaster, createRaster, sameGrid, readValues
+from standardize import columnRanges
+
+DEFAULT_TILE_SIZE = 512
+
+# tiles sent to the pool at once, per worker
+TILES_PER_WORKER = 4
+
+# ----- function definitions -------------------------------------------
+
+def bandNames(paths):
+    """ returns the file names of the bands, as used in messages """
+    return [os.path.basename(str(path).rstrip("/\\")) for path in paths]
+
+def checkAligned(sources, names):
+    """ raises an error for every band not on the grid of the first one """
+    for source, name in zip(sources[1:], names[1:]):
+        if not sameGrid(sources[0], source):
+            raise ValueError(name+" is not aligned with "+names[0]+"; resample the criteria to one grid")
+
+def tileWindows(nrows, ncols, tilesize):
+    """ returns the (row, col, nrows, ncols) windows of the tiles covering the grid """
+    return [(row, col, min(tilesize, nrows - row), min(tilesize, ncols - col))
+            for row in range(0, nrows, tilesize) for col in range(0, ncols, tilesize)]
+
+def readStack(sources, window):
+    """ returns the (rows x cols x k) values of the window in all bands, NaN on NoData """
+    return numpy.stack([readValues(source, *window) for source in sources], axis=2)
+
+def bandRanges(sources, windows):
+    """ returns (mins, maxes) of every band over the cells of all tiles
+        with a value in every band, the cells that are scored """
+    mins = maxes = None
+    for window in windows:
+        stack = readStack(sources, window)
+        mins, maxes = columnRanges(stack[~numpy.isnan(stack).any(axis=2)], mins, maxes)
+    return mins, maxes
+
+def scoreTile(stack, weights, rule, bounds=None, names=None):
+    """ returns the (rows x cols) scores of a tile of criteria, NaN on the
+        cells without a value in every band """
+    valid = ~numpy.isnan(stack).any(axis=2)
+    scores = numpy.full(valid.shape, numpy.nan)
+    matrix = stack[valid]
+    if len(matrix):
+        inrange = (matrix.min(axis=0) >= 0) & (matrix.max(axis=0) <= 1)
+        if not inrange.all():
+            bad = [name for name, ok in zip(names or range(stack.shape[2]), inrange) if not ok]
+            raise ValueError(", ".join(str(name) for name in bad)+" is not standardized to [0.0,1.0] range")
+        scores[valid] = rule(matrix, [weights], bounds)[0]
+    return scores
+
+_workerSources = None
+_workerNames = None
+_workerScoring = None
+
+def _initWorker(paths, weights, rule, bounds):
+    """ opens the bands and keeps the scoring in the worker process """
+    global _workerSources, _workerNames, _workerScoring
+    _workerSources = [getRaster(path) for path in paths]
+    _workerNames = bandNames(paths)
+    _workerScoring = (weights, getDecisionRule(rule), bounds)
+
+def _workerTile(window):
+    weights, rule, bounds = _workerScoring
+    return scoreTile(readStack(_workerSources, window), weights, rule, bounds, _workerNames)
+
+def rasterScores(paths, outpath, weights, rule="weighted_sum", tilesize=DEFAULT_TILE_SIZE, workers=1, progress=None):
+    """
+        in: paths of the criterion rasters (list, aligned bands standardized to [0.0, 1.0]),
+            outpath path of the score raster (.npy or .asc are written
+            without arcpy, see rasters.createRaster),
+            weights (list, one per band, rescaled here to add up to 1.0;
+            their sum must be positive),
+            rule decision rule scoring the cells (see decision_rules.DECISION_RULES),
+            tilesize rows and columns of a tile (int),
+            workers number of worker processes (int, 1 scores in this process),
+            progress optional callback progress(message)
+        out: number of cells scored
+        writes the score raster tile by tile
+    """
+    paths = list(paths)
+    if len(paths) == 0:
+        raise ValueError("no criterion rasters given")
+    if len(weights) != len(paths):
+        raise ValueError("the number of weights does not match the number of criterion rasters")
+    weights = normalizeWeights(weights, len(paths))[0]
+    if tilesize is None or tilesize < 1:
+        raise ValueError("the tile size must be at least 1")
+    rulename = rule
+    rule = getDecisionRule(rule)
+    names = bandNames(paths)
+    sources = [getRaster(path) for path in paths]
+    checkAligned(sources, names)
+    template = sources[0]
+    windows = tileWindows(template.nrows, template.ncols, int(tilesize))
+
+    bounds = None
+    if rule.bounded:
+        mins, maxes = bandRanges(sources, windows)
+        if (mins > maxes).any():
+            raise ValueError("the criterion rasters have no cells with a value in every band")
+        bounds = (maxes, mins)
+        if progress is not None:
+            progress("best and worst value of "+str(len(paths))+" bands read")
+
+    writer = createRaster(outpath, template)
+    cells = 0
+    try:
+        if workers is None or workers <= 1:
+            results = (scoreTile(readStack(sources, window), weights, rule, bounds, names) for window in windows)
+            for window, scores in zip(windows, results):
+                writer.writeBlock(window[0], window[1], scores)
+                cells += int((~numpy.isnan(scores)).sum())
+        else:
+            batch = workers*TILES_PER_WORKER
+            with processPool(workers, _initWorker, (paths, weights, rulename, bounds)) as pool:
+                for start in range(0, len(windows), batch):
+                    chunk = windows[start:start+batch]
+                    for window, scores in zip(chunk, pool.map(_workerTile, chunk)):
+                        writer.writeBlock(window[0], window[1], scores)
+                        cells += int((~numpy.isnan(scores)).sum())
+                    if progress is not None:
+                        progress(str(start + len(chunk))+" of "+str(len(windows))+" tiles scored")
+    finally:
+        writer.close()
+    return cells
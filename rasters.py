@@ -0,0 +1,298 @@
+# Raster access as numpy arrays and sampling of raster values at points
+#
+# RASTERS are read through sources that share one interface: the size
+# (nrows x ncols), the GEOTRANSFORM (x0, y0 upper left corner, cellwidth,
+# cellheight), the NoData value and readBlock(row, col, nrows, ncols), which
+# returns a window of cells as a numpy array (row 0 at the top):
+#   ArcpyRaster - any raster dataset or layer through arcpy
+#   AsciiGrid   - ESRI ASCII grid (.asc); the file offset of every row is
+#                 found once, so a window only parses its own rows
+#   NPYRaster   - numpy array saved with numpy.save, read memory-mapped, with
+#                 a world file (.wld: cell width, 0, 0, -cell height, x and y
+#                 of the center of the upper left cell)
+# the local sources stand in for raster datasets on machines without ArcGIS
+#
+# OUTPUT rasters of the same kinds are written window by window with
+# writeBlock(row, col, block) on the grid of a template raster; empty cells
+# are NaN (NoData)
+#
+# SAMPLING maps point coordinates to cell rows and columns through the
+# geotransform and gathers the cell values with one fancy index; for large
+# rasters the points are grouped into bands of rows and only the window of
+# every band that holds points is read. Points outside the raster or on
+# NoData cells get NaN
+#------------- IMPORTS ------------------------------------------------
+import os, io, tempfile
+import numpy
+
+from decision_matrix import ArcpyBackend, getBackend, splitFields
+
+# NoData value of the ASCII grids written
+ASCII_NODATA = -9999
+
+# ----- raster sources -------------------------------------------------
+
+class ArcpyRaster(object):
+    """ raster dataset or layer read with arcpy """
+
+    def __init__(self, path):
+        import arcpy
+        self.path = path
+        raster = arcpy.Raster(path)
+        self.nrows, self.ncols = raster.height, raster.width
+        self.x0, self.y0 = raster.extent.XMin, raster.extent.YMax
+        self.cellwidth, self.cellheight = raster.meanCellWidth, raster.meanCellHeight
+        self.nodata = raster.noDataValue
+        self.integer = raster.isInteger
+
+    def readBlock(self, row, col, nrows, ncols):
+        """ returns the (nrows x ncols) window of cells from row, col """
+        import arcpy
+        corner = arcpy.Point(self.x0 + col*self.cellwidth, self.y0 - (row + nrows)*self.cellheight)
+        return arcpy.RasterToNumPyArray(self.path, corner, ncols, nrows)
+
+class AsciiGrid(object):
+    """ ESRI ASCII grid """
+
+    def __init__(self, path):
+        self.path = path
+        header = {}
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if not parts or not parts[0][0].isalpha():
+                    break
+                header[parts[0].lower()] = float(parts[1])
+        self.headerlines = len(header)
+        self.nrows, self.ncols = int(header["nrows"]), int(header["ncols"])
+        self.cellwidth = self.cellheight = header["cellsize"]
+        if "xllcenter" in header:
+            self.x0 = header["xllcenter"] - self.cellwidth/2.0
+            bottom = header["yllcenter"] - self.cellheight/2.0
+        else:
+            self.x0 = header["xllcorner"]
+            bottom = header["yllcorner"]
+        self.y0 = bottom + self.nrows*self.cellheight
+        self.nodata = header.get("nodata_value")
+        self.integer = False
+        self.offsets = None
+
+    def rowOffsets(self):
+        """ returns the file offset of every row of cells and of the end of
+            the last row, found in one pass over the file the first time a
+            window is read """
+        if self.offsets is None:
+            offsets = numpy.empty(self.nrows + 1, dtype=numpy.int64)
+            position = 0
+            row = -self.headerlines
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if row >= 0 and line.strip():
+                        if row == self.nrows:
+                            break
+                        offsets[row] = position
+                        offsets[row+1] = position + len(line)
+                        row += 1
+                    elif row < 0:
+                        row += 1
+                    position += len(line)
+            if row < self.nrows:
+                raise ValueError(self.path+" has "+str(row)+" rows of cells instead of "+str(self.nrows))
+            self.offsets = offsets
+        return self.offsets
+
+    def readBlock(self, row, col, nrows, ncols):
+        """ returns the (nrows x ncols) window of cells from row, col; only
+            the rows of the window are parsed """
+        offsets = self.rowOffsets()
+        with open(self.path, "rb") as f:
+            f.seek(offsets[row])
+            text = f.read(offsets[row+nrows] - offsets[row])
+        block = numpy.loadtxt(io.BytesIO(text), ndmin=2)
+        return block[:, col:col+ncols]
+
+class NPYRaster(object):
+    """ numpy array saved as .npy with a world file """
+
+    def __init__(self, path, nodata=None):
+        self.path = path
+        self.array = numpy.load(path, mmap_mode="r")
+        if self.array.ndim != 2:
+            raise ValueError(path+" is not a 2-dimensional array")
+        self.nrows, self.ncols = self.array.shape
+        worldfile = os.path.splitext(path)[0]+".wld"
+        if not os.path.exists(worldfile):
+            raise ValueError("world file "+worldfile+" not found")
+        with open(worldfile) as world:
+            a, d, b, e, c, f = [float(value) for value in world.read().split()[:6]]
+        if d != 0 or b != 0:
+            raise ValueError("rotated rasters are not supported")
+        self.cellwidth, self.cellheight = a, -e
+        self.x0, self.y0 = c - a/2.0, f - e/2.0
+        self.nodata = nodata
+        self.integer = self.array.dtype.kind in "iu"
+
+    def readBlock(self, row, col, nrows, ncols):
+        """ returns the (nrows x ncols) window of cells from row, col """
+        return numpy.asarray(self.array[row:row+nrows, col:col+ncols])
+
+class ArcpyRasterWriter(object):
+    """ float raster dataset written with arcpy on the grid of a template """
+
+    def __init__(self, path, template):
+        import arcpy
+        self.path = path
+        info = arcpy.Raster(template.path).getRasterInfo()
+        info.setPixelType("F64")
+        info.setNoDataValues([numpy.nan])
+        self.raster = arcpy.Raster(info)
+
+    def writeBlock(self, row, col, block):
+        """ writes a window of cells at row, col """
+        self.raster.write(block, (col, row))
+
+    def close(self):
+        self.raster.save(self.path)
+
+class AsciiGridWriter(object):
+    """ ESRI ASCII grid on the grid of a template, written when closed """
+
+    def __init__(self, path, template):
+        self.path = path
+        self.template = template
+        handle, self.buffer = tempfile.mkstemp(suffix=".npy")
+        os.close(handle)
+        self.array = numpy.lib.format.open_memmap(self.buffer, mode="w+", dtype=numpy.float64,
+                                                  shape=(template.nrows, template.ncols))
+
+    def writeBlock(self, row, col, block):
+        """ writes a window of cells at row, col """
+        self.array[row:row+block.shape[0], col:col+block.shape[1]] = block
+
+    def close(self):
+        t = self.template
+        with open(self.path, "w") as f:
+            f.write("ncols "+str(t.ncols)+"\nnrows "+str(t.nrows)+"\nxllcorner "+repr(t.x0)+
+                    "\nyllcorner "+repr(t.y0 - t.nrows*t.cellheight)+"\ncellsize "+repr(t.cellwidth)+
+                    "\nNODATA_value "+str(ASCII_NODATA)+"\n")
+            for row in self.array:
+                f.write(" ".join(repr(value) for value in numpy.where(numpy.isnan(row), ASCII_NODATA, row).tolist())+"\n")
+        del self.array
+        os.remove(self.buffer)
+
+class NPYRasterWriter(object):
+    """ float .npy raster with a world file on the grid of a template """
+
+    def __init__(self, path, template):
+        self.path = path
+        self.array = numpy.lib.format.open_memmap(path, mode="w+", dtype=numpy.float64,
+                                                  shape=(template.nrows, template.ncols))
+        with open(os.path.splitext(path)[0]+".wld", "w") as f:
+            f.write("\n".join(repr(float(value)) for value in
+                              (template.cellwidth, 0.0, 0.0, -template.cellheight,
+                               template.x0 + template.cellwidth/2.0, template.y0 - template.cellheight/2.0))+"\n")
+
+    def writeBlock(self, row, col, block):
+        """ writes a window of cells at row, col """
+        self.array[row:row+block.shape[0], col:col+block.shape[1]] = block
+
+    def close(self):
+        self.array.flush()
+        del self.array
+
+# ----- function definitions -------------------------------------------
+
+def getRaster(path):
+    """ returns the raster source that reads path, chosen from its extension """
+    extension = os.path.splitext(path.lower())[1]
+    if extension == ".asc":
+        return AsciiGrid(path)
+    if extension == ".npy":
+        return NPYRaster(path)
+    return ArcpyRaster(path)
+
+def createRaster(path, template):
+    """ returns the writer of a float output raster at path on the grid of
+        the template raster source, chosen from the extension of path """
+    extension = os.path.splitext(path.lower())[1]
+    if extension == ".asc":
+        return AsciiGridWriter(path, template)
+    if extension == ".npy":
+        return NPYRasterWriter(path, template)
+    return ArcpyRasterWriter(path, template)
+
+def sameGrid(a, b):
+    """ returns True if two raster sources have the same size and geotransform """
+    return (a.nrows, a.ncols) == (b.nrows, b.ncols) and \
+           numpy.allclose([a.x0, a.y0, a.cellwidth, a.cellheight],
+                          [b.x0, b.y0, b.cellwidth, b.cellheight], rtol=0, atol=1e-6*a.cellwidth)
+
+def readValues(raster, row, col, nrows, ncols):
+    """ returns a window of cells as floats, NaN on NoData cells """
+    block = numpy.asarray(raster.readBlock(row, col, nrows, ncols), dtype=float)
+    if raster.nodata is not None:
+        block = numpy.where(block == raster.nodata, numpy.nan, block)
+    return block
+
+def cellIndices(raster, x, y):
+    """ returns (rows, cols, inside) of the cells holding the points x, y """
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    with numpy.errstate(invalid="ignore"):
+        cols = numpy.floor((x - raster.x0)/raster.cellwidth)
+        rows = numpy.floor((raster.y0 - y)/raster.cellheight)
+        inside = (rows >= 0) & (rows < raster.nrows) & (cols >= 0) & (cols < raster.ncols)
+    rows = numpy.where(inside, rows, 0).astype(numpy.intp)
+    cols = numpy.where(inside, cols, 0).astype(numpy.intp)
+    return rows, cols, inside
+
+def sampleRaster(raster, x, y, blockrows=None):
+    """
+        in: raster source (see getRaster), x and y point coordinates (numpy arrays),
+            blockrows number of raster rows read at once (int, None reads the whole raster)
+        out: values of the cells holding the points (float numpy array, NaN
+             outside the raster and on NoData cells)
+    """
+    rows, cols, inside = cellIndices(raster, x, y)
+    values = numpy.full(len(rows), numpy.nan)
+    points = numpy.flatnonzero(inside)
+    if len(points) == 0:
+        return values
+    if blockrows is None or blockrows >= raster.nrows:
+        grid = raster.readBlock(0, 0, raster.nrows, raster.ncols)
+        values[points] = grid[rows[points], cols[points]]
+    else:
+        # points grouped by band of rows, only the window holding them is read
+        band = rows[points]//blockrows
+        order = numpy.argsort(band, kind="stable")
+        points = points[order]
+        bounds = numpy.flatnonzero(numpy.diff(band[order])) + 1
+        for group in numpy.split(points, bounds):
+            top = (rows[group[0]]//blockrows)*blockrows
+            nrows = min(blockrows, raster.nrows - top)
+            left = cols[group].min()
+            ncols = cols[group].max() - left + 1
+            block = raster.readBlock(top, left, nrows, ncols)
+            values[group] = block[rows[group] - top, cols[group] - left]
+    if raster.nodata is not None:
+        values[values == raster.nodata] = numpy.nan
+    return values
+
+def readPoints(table, xyfields=None, backend=None):
+    """
+        in: table path or layer name (string), xyfields X and Y fields (list or
+            ';'-delimited string, None uses the true centroids of the features),
+            backend reading the table (None picks one from the table path)
+        out: (oids, x, y) numpy arrays
+    """
+    if backend is None:
+        backend = getBackend(table)
+    if xyfields:
+        xyfields = splitFields(xyfields)
+        if len(xyfields) != 2:
+            raise ValueError("give one X and one Y field")
+        oids, matrix = backend.readColumns(table, xyfields)
+        return oids, matrix[:, 0], matrix[:, 1]
+    if not isinstance(backend, ArcpyBackend):
+        raise ValueError("the X and Y fields of "+table+" are needed")
+    return backend.readCentroids(table)
@@ -0,0 +1,248 @@
+# Samplers of the unit hypercube for the Monte Carlo and GSA weight draws
+#
+# A SAMPLER generates (runs x k) blocks of points in [0,1)^k, which are
+# scaled to the per-criterion [min, max] weight ranges:
+#   random - pseudo-random numbers from random.Random, consumed in the same
+#            order as the original scripts
+#   sobol  - Sobol' low discrepancy sequence (Joe & Kuo direction numbers),
+#            scrambled by a random linear matrix scramble and digital shift
+#   lhs    - Latin hypercube of N points: every criterion range is split in
+#            N strata and every stratum is sampled exactly once
+# Sobol' and Latin hypercube points can be drawn in any block order
+# (block(start, runs)), so parallel chunks read disjoint parts of one design
+#
+# Sobol' points are best balanced when N is a power of 2
+#
+# Joe, S. and F. Y. Kuo (2008) Constructing Sobol sequences with better
+#   two-dimensional projections. SIAM J. Sci. Comput. 30, 2635-2654
+#------------- IMPORTS ------------------------------------------------
+import random
+import numpy
+
+SAMPLERS = ("random", "sobol", "lhs")
+
+# bits of precision of the Sobol' points
+SOBOL_BITS = 32
+
+# initial direction numbers m_1..m_s of dimensions 2, 3, ... (new-joe-kuo-6);
+# the primitive polynomials are generated in the same order by
+# primitivePolynomials
+JOE_KUO_M = [
+    (1,), (1, 3), (1, 3, 1), (1, 1, 1), (1, 1, 3, 3), (1, 3, 5, 13),
+    (1, 1, 5, 5, 17), (1, 1, 5, 5, 5), (1, 1, 7, 11, 19), (1, 1, 5, 1, 1),
+    (1, 1, 1, 3, 11), (1, 3, 5, 5, 31), (1, 3, 3, 9, 7, 49),
+    (1, 1, 1, 15, 21, 21), (1, 3, 1, 13, 27, 49), (1, 1, 1, 15, 7, 5),
+    (1, 3, 1, 15, 13, 25), (1, 1, 5, 5, 19, 61), (1, 3, 7, 11, 23, 15, 103),
+    (1, 3, 7, 13, 13, 15, 69), (1, 1, 3, 13, 7, 35, 63),
+    (1, 3, 5, 9, 1, 25, 53), (1, 3, 1, 13, 9, 35, 107),
+    (1, 3, 1, 5, 27, 61, 31), (1, 1, 5, 11, 19, 41, 61),
+    (1, 3, 5, 3, 3, 13, 69), (1, 1, 7, 13, 1, 19, 1),
+    (1, 3, 7, 5, 13, 19, 59), (1, 1, 3, 9, 25, 29, 41),
+    (1, 3, 5, 13, 23, 1, 55), (1, 3, 7, 3, 13, 59, 17),
+    (1, 3, 1, 3, 5, 53, 69), (1, 1, 5, 5, 23, 33, 13),
+    (1, 1, 7, 7, 1, 61, 123), (1, 1, 7, 9, 13, 61, 49),
+    (1, 3, 3, 5, 3, 55, 33)]
+
+# rows of a Latin hypercube sharing one block of random jitter
+LHS_PAGE = 4096
+
+# ----- function definitions -------------------------------------------
+
+def _polyMod(a, b):
+    """ returns a modulo b for polynomials over GF(2) stored as bit masks """
+    db = b.bit_length()
+    while a.bit_length() >= db:
+        a ^= b << (a.bit_length() - db)
+    return a
+
+def _polyPowMod(base, exponent, modulus):
+    result = 1
+    base = _polyMod(base, modulus)
+    while exponent:
+        if exponent & 1:
+            result = _polyMod(_polyMulPlain(result, base), modulus)
+        base = _polyMod(_polyMulPlain(base, base), modulus)
+        exponent >>= 1
+    return result
+
+def _polyMulPlain(a, b):
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        a <<= 1
+        b >>= 1
+    return result
+
+def _primeFactors(n):
+    factors, p = [], 2
+    while p*p <= n:
+        if n % p == 0:
+            factors.append(p)
+            while n % p == 0:
+                n //= p
+        p += 1
+    if n > 1:
+        factors.append(n)
+    return factors
+
+def primitivePolynomials(count):
+    """ returns the first count primitive polynomials over GF(2) as (s, a)
+        pairs ordered by degree s, then by the inner coefficients a """
+    found = []
+    s = 1
+    while len(found) < count:
+        order = 2**s - 1
+        for a in range(2**(s-1)):
+            poly = (1 << s) | (a << 1) | 1
+            # x must have multiplicative order 2**s - 1 modulo poly
+            if _polyPowMod(2, order, poly) != 1:
+                continue
+            if all(_polyPowMod(2, order//q, poly) != 1 for q in _primeFactors(order)):
+                found.append((s, a))
+                if len(found) == count:
+                    break
+        s += 1
+    return found
+
+def sobolDirections(k, bits=SOBOL_BITS):
+    """ returns the (k x bits) direction numbers of the first k Sobol' dimensions """
+    V = numpy.zeros((k, bits), dtype=numpy.uint64)
+    V[0] = [1 << (bits-1-b) for b in range(bits)]
+    for d, (s, a) in enumerate(primitivePolynomials(k-1), start=1):
+        if d-1 < len(JOE_KUO_M):
+            m = list(JOE_KUO_M[d-1])
+        else:
+            # beyond the table any odd m_i < 2**i gives a valid sequence
+            choose = random.Random(d)
+            m = [2*choose.randrange(2**(i-1)) + 1 for i in range(1, s+1)]
+        v = [m[i] << (bits-1-i) for i in range(min(s, bits))]
+        for i in range(s, bits):
+            value = v[i-s] ^ (v[i-s] >> s)
+            for j in range(1, s):
+                if (a >> (s-1-j)) & 1:
+                    value ^= v[i-j]
+            v.append(value)
+        V[d] = v
+    return V
+
+def scaleSamples(unit, mins, maxes):
+    """ returns unit hypercube points scaled to the [min, max] ranges """
+    return mins + (maxes - mins)*unit
+
+def getSampler(name, k, N, seed=None):
+    """ returns the sampler called name (see SAMPLERS) of k dimensions for a
+        design of N points """
+    if name in (None, "random"):
+        return PseudoRandomSampler(k, seed)
+    if name == "sobol":
+        return SobolSampler(k, seed)
+    if name == "lhs":
+        return LatinHypercubeSampler(k, N, seed)
+    raise ValueError("unknown sampler "+str(name)+"; use one of "+", ".join(SAMPLERS))
+
+# ----- class definitions ----------------------------------------------
+
+class PseudoRandomSampler(object):
+    """ pseudo-random points, drawn in order only """
+
+    def __init__(self, k, seed=None, rng=None):
+        """
+            in: k number of dimensions (int), seed of the random generator (int),
+                rng random-style generator to draw from instead (random.Random)
+        """
+        self.k = k
+        self.rng = rng if rng is not None else random.Random(seed)
+
+    def draw(self, runs):
+        """ returns the next (runs x k) block of points """
+        draws = [self.rng.random() for i in range(runs*self.k)]
+        return numpy.array(draws, dtype=float).reshape(runs, self.k)
+
+class SobolSampler(object):
+    """ scrambled Sobol' points, drawn in order or by index """
+
+    def __init__(self, k, seed=None, scramble=True):
+        """
+            in: k number of dimensions (int), seed of the scrambling (int),
+                scramble randomizes the sequence (bool)
+        """
+        self.k = k
+        self.position = 0
+        V = sobolDirections(k)
+        self.shift = numpy.zeros(k, dtype=numpy.uint64)
+        if scramble:
+            rng = numpy.random.default_rng(seed)
+            bits = SOBOL_BITS
+            for d in range(k):
+                # lower triangular scramble matrix with unit diagonal: output
+                # bit r is the parity of the input bits down to r
+                rows = [(int(rng.integers(0, 2**r)) << (bits-r)) | (1 << (bits-1-r)) for r in range(bits)]
+                scrambled = []
+                for v in V[d].tolist():
+                    value = 0
+                    for r, row in enumerate(rows):
+                        value |= (bin(row & v).count("1") & 1) << (bits-1-r)
+                    scrambled.append(value)
+                V[d] = scrambled
+            self.shift = rng.integers(0, 2**bits, size=k, dtype=numpy.uint64)
+        self.V = V
+
+    def block(self, start, runs):
+        """ returns the (runs x k) points number start .. start+runs-1 """
+        if start + runs > 2**SOBOL_BITS:
+            raise ValueError("too many Sobol' points requested")
+        index = numpy.arange(start, start+runs, dtype=numpy.uint64)
+        gray = index ^ (index >> numpy.uint64(1))
+        points = numpy.broadcast_to(self.shift, (runs, self.k)).copy()
+        for b in range(int(start+runs).bit_length()):
+            on = ((gray >> numpy.uint64(b)) & numpy.uint64(1)).astype(bool)
+            points[on] ^= self.V[:, b]
+        return points.astype(float)/2.0**SOBOL_BITS
+
+    def draw(self, runs):
+        """ returns the next (runs x k) block of points """
+        points = self.block(self.position, runs)
+        self.position += runs
+        return points
+
+class LatinHypercubeSampler(object):
+    """ Latin hypercube of N points, drawn in order or by index """
+
+    def __init__(self, k, N, seed=None):
+        """
+            in: k number of dimensions (int), N number of points (int),
+                seed of the random generator (int)
+        """
+        self.k = k
+        self.N = int(N)
+        self.position = 0
+        self.entropy = numpy.random.SeedSequence(seed).entropy
+        rng = numpy.random.default_rng(numpy.random.SeedSequence(self.entropy, spawn_key=(0,)))
+        dtype = numpy.uint32 if self.N < 2**32 else numpy.int64
+        # stratum of every point in every dimension
+        self.strata = numpy.empty((self.N, k), dtype=dtype)
+        for d in range(k):
+            self.strata[:, d] = rng.permutation(self.N)
+
+    def block(self, start, runs):
+        """ returns the (runs x k) points number start .. start+runs-1 """
+        if start + runs > self.N:
+            raise ValueError("a latin hypercube only holds "+str(self.N)+" points")
+        points = numpy.empty((runs, self.k), dtype=float)
+        for page in range(start//LHS_PAGE, (start+runs-1)//LHS_PAGE + 1):
+            # the jitter within the strata is drawn page by page, so a point
+            # does not depend on the blocks it is drawn in
+            rng = numpy.random.default_rng(numpy.random.SeedSequence(self.entropy, spawn_key=(page+1,)))
+            jitter = rng.random((LHS_PAGE, self.k))
+            lo = max(start, page*LHS_PAGE)
+            hi = min(start+runs, (page+1)*LHS_PAGE)
+            points[lo-start:hi-start] = jitter[lo-page*LHS_PAGE:hi-page*LHS_PAGE]
+        points += self.strata[start:start+runs]
+        return points/self.N
+
+    def draw(self, runs):
+        """ returns the next (runs x k) block of points """
+        points = self.block(self.position, runs)
+        self.position += runs
+        return points
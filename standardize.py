@@ -0,0 +1,135 @@
+# Standardization of raw criteria (fields) to the 0.0 - 1.0 range
+#
+# METHODS, with MIN and MAX of every field over the whole table:
+#   Score Range          - benefit: (value - MIN)/(MAX - MIN)
+#                          cost:    (MAX - value)/(MAX - MIN)
+#   Ratio (Linear Scale) - benefit: value/MAX
+#                          cost:    MIN/value
+# as in the original Standard.py; method and cost/benefit can be given for
+# every field or once for all of them
+#
+# All fields are standardized together: their MIN and MAX come from one
+# columnar pass and the transforms are applied to whole (rows x fields)
+# blocks. A table that fits in memory is read once and written back in one
+# pass; in CHUNKED mode (chunkrows given) the table is read in chunks twice,
+# for the MIN/MAX and for the transforms, and the standardized chunks are
+# written back in one streaming pass (see decision_matrix.py)
+#
+# Empty values are skipped by MIN and MAX and stay empty (NaN)
+#------------- IMPORTS ------------------------------------------------
+import numpy
+
+from decision_matrix import getBackend, splitFields, writeOutputColumns, readColumnChunks, writeColumnChunks, ChunkSpool
+
+METHODS = ("Score Range", "Ratio (Linear Scale)")
+COST_BENEFIT = ("Cost", "Benefit")
+
+# ----- function definitions -------------------------------------------
+
+def perField(values, choices, fieldnum, name):
+    """ returns a list of fieldnum choices from one value or one value per
+        field (case insensitive, as the original script) """
+    if isinstance(values, str):
+        values = [values]
+    values = list(values)
+    if len(values) == 1:
+        values = values*fieldnum
+    if len(values) != fieldnum:
+        raise ValueError("the number of "+name+" values does not match the number of fields")
+    lookup = dict((choice.upper(), choice) for choice in choices)
+    result = []
+    for value in values:
+        if str(value).upper() not in lookup:
+            raise ValueError("unknown "+name+" "+str(value)+"; use one of "+", ".join(choices))
+        result.append(lookup[str(value).upper()])
+    return result
+
+def columnRanges(matrix, mins=None, maxes=None):
+    """ returns (mins, maxes) of the columns of matrix, ignoring NaN, merged
+        with the (mins, maxes) of the previous chunks if given """
+    missing = numpy.isnan(matrix)
+    lo = numpy.where(missing, numpy.inf, matrix).min(axis=0, initial=numpy.inf)
+    hi = numpy.where(missing, -numpy.inf, matrix).max(axis=0, initial=-numpy.inf)
+    if mins is not None:
+        lo = numpy.minimum(lo, mins)
+        hi = numpy.maximum(hi, maxes)
+    return lo, hi
+
+def checkRanges(fields, mins, maxes, methods, benefits):
+    """ raises an error for every field that the transform cannot standardize """
+    for field, lo, hi, method, benefit in zip(fields, mins, maxes, methods, benefits):
+        if lo > hi:
+            raise ValueError(field+" has no values")
+        if method == "Score Range" and lo == hi:
+            raise ValueError(field+" has a single value "+str(lo)+"; its score range is 0")
+        if method != "Score Range" and benefit == "Benefit" and (lo < 0 or hi <= 0):
+            raise ValueError(field+" has values below 0 or a maximum of 0; use the score range method")
+        if method != "Score Range" and benefit == "Cost" and lo <= 0:
+            raise ValueError(field+" has values of 0 or below; use the score range method")
+
+def standardizeBlock(matrix, mins, maxes, methods, benefits):
+    """ returns the (rows x fields) block of standardized values of matrix """
+    result = numpy.empty(matrix.shape, dtype=float)
+    methods = numpy.asarray(methods)
+    benefits = numpy.asarray(benefits)
+    for method in METHODS:
+        for benefit in COST_BENEFIT:
+            columns = numpy.flatnonzero((methods == method) & (benefits == benefit))
+            if len(columns) == 0:
+                continue
+            values = matrix[:, columns]
+            lo = mins[columns]
+            hi = maxes[columns]
+            if method == "Score Range":
+                arange = hi - lo
+                if benefit == "Benefit":
+                    result[:, columns] = (values - lo)/arange
+                else:
+                    result[:, columns] = (hi - values)/arange
+            elif benefit == "Benefit":
+                result[:, columns] = values/hi
+            else:
+                result[:, columns] = lo/values
+    return result
+
+def standardizeFields(table, fields, outfields, method, benefit, chunkrows=None, backend=None, cache=None):
+    """
+        in: table path or layer name (string), fields raw criteria (list or ';'-delimited string),
+            outfields names of the standardized fields (list),
+            method (see METHODS) and benefit (see COST_BENEFIT), one for all
+            fields or one per field,
+            chunkrows number of rows read at once (int, None reads the whole table),
+            backend reading and writing the table (None picks one from the table path),
+            cache MatrixCache kept valid for the unchanged fields (optional)
+        out: (mins, maxes) of the fields (numpy arrays)
+    """
+    fields = splitFields(fields)
+    outfields = splitFields(outfields)
+    if len(outfields) != len(fields):
+        raise ValueError("the number of output fields does not match the number of fields")
+    methods = perField(method, METHODS, len(fields), "standardization method")
+    benefits = perField(benefit, COST_BENEFIT, len(fields), "cost/benefit")
+    if backend is None:
+        backend = getBackend(table)
+
+    if chunkrows is None:
+        oids, matrix = backend.readColumns(table, fields)
+        mins, maxes = columnRanges(matrix)
+        checkRanges(fields, mins, maxes, methods, benefits)
+        result = standardizeBlock(matrix, mins, maxes, methods, benefits)
+        writeOutputColumns(table, oids, dict(zip(outfields, result.T)), backend, cache)
+        return mins, maxes
+
+    # pass 1 - MIN and MAX of all fields
+    mins = maxes = None
+    for oids, matrix in readColumnChunks(table, fields, chunkrows, backend):
+        mins, maxes = columnRanges(matrix, mins, maxes)
+    if mins is None:
+        raise ValueError("the input table has no rows")
+    checkRanges(fields, mins, maxes, methods, benefits)
+    # pass 2 - standardized chunks, spooled until the table is written in one pass
+    with ChunkSpool(len(fields)) as spool:
+        for oids, matrix in readColumnChunks(table, fields, chunkrows, backend):
+            spool.append(oids, standardizeBlock(matrix, mins, maxes, methods, benefits))
+        writeColumnChunks(table, outfields, spool.chunks(chunkrows), backend, cache)
+    return mins, maxes
@@ -0,0 +1,57 @@
+# Tests of the single-pass correlation matrices against numpy, in memory and
+# streamed in chunks
+import numpy
+import pytest
+
+from correlation import correlationMatrices, pValues, tStatistics
+
+def writeCSV(path, matrix):
+    """ writes the columns of matrix as fields f0, f1, ...; NaN as empty values """
+    with open(path, "w") as f:
+        f.write("OBJECTID,"+",".join("f"+str(j) for j in range(matrix.shape[1]))+"\n")
+        for i, row in enumerate(matrix.tolist(), start=1):
+            f.write(str(i)+","+",".join("" if numpy.isnan(value) else repr(value) for value in row)+"\n")
+    return path
+
+def averageRanks(column):
+    """ returns the ranks of column, tied values sharing their average rank """
+    order = numpy.argsort(column, kind="stable")
+    ranks = numpy.empty(len(column))
+    ranks[order] = numpy.arange(1, len(column)+1)
+    for value in numpy.unique(column):
+        ranks[column == value] = ranks[column == value].mean()
+    return ranks
+
+@pytest.fixture
+def data(tmp_path):
+    rng = numpy.random.default_rng(19)
+    matrix = rng.random((50, 3))
+    matrix[:, 1] += matrix[:, 0]
+    matrix[:, 2] = numpy.round(matrix[:, 2], 1)
+    raw = matrix.copy()
+    raw[[4, 17], [0, 2]] = numpy.nan
+    return writeCSV(str(tmp_path / "criteria.csv"), raw), numpy.delete(matrix, [4, 17], axis=0)
+
+def test_correlations(data):
+    table, complete = data
+    n, matrices = correlationMatrices(table, "f0;f1;f2")
+    # rows with an empty value are left out
+    assert n == 48
+    assert numpy.allclose(matrices["pearson"], numpy.corrcoef(complete, rowvar=False))
+    ranks = numpy.column_stack([averageRanks(column) for column in complete.T])
+    assert numpy.allclose(matrices["spearman"], numpy.corrcoef(ranks, rowvar=False))
+
+def test_streamed(data):
+    table, complete = data
+    n, matrices = correlationMatrices(table, ["f0", "f1", "f2"], ["pearson"], chunkrows=7)
+    assert n == 48
+    assert numpy.allclose(matrices["pearson"], correlationMatrices(table, ["f0", "f1", "f2"])[1]["pearson"])
+    with pytest.raises(ValueError):
+        correlationMatrices(table, ["f0", "f1"], chunkrows=7)
+
+def test_significance():
+    # two-sided 5% critical value of t with 10 degrees of freedom
+    assert pValues(numpy.array([2.228138851986]), 10)[0] == pytest.approx(0.05, abs=1e-9)
+    assert pValues(numpy.array([0.0]), 10)[0] == pytest.approx(1.0)
+    t = tStatistics(numpy.array([0.5]), 12)
+    assert t[0] == pytest.approx(0.5*numpy.sqrt(10/0.75))
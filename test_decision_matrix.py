@@ -0,0 +1,89 @@
+# Tests of the decision matrix loader on the local backends (CSV, NPY and
+# SQLite tables standing in for a geodatabase)
+import csv, sqlite3
+from contextlib import closing
+
+import numpy
+import pytest
+
+from decision_matrix import loadStandardizedDecisionMatrix, writeOutputColumns, getBackend, OID_FIELD
+
+OIDS = numpy.array([2, 3, 5, 8, 13, 21])
+COLUMNS = {"a": [0.1, 0.5, 0.0, 1.0, 0.25, 0.75],
+           "b": [0.9, 0.2, 0.4, 0.4, 0.6, 0.0],
+           "c": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]}
+
+def writeTables(directory):
+    """ writes OIDS and COLUMNS as a CSV file, a .npy structured array and a
+        SQLite table; returns their table paths """
+    names = [OID_FIELD] + list(COLUMNS)
+    rows = list(zip(OIDS.tolist(), *COLUMNS.values()))
+    csvpath = str(directory / "sites.csv")
+    with open(csvpath, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        writer.writerows(rows)
+    npypath = str(directory / "sites.npy")
+    numpy.save(npypath, numpy.array(rows, dtype=[(OID_FIELD, numpy.int64)] + [(name, float) for name in COLUMNS]))
+    database = str(directory / "sites.sqlite")
+    with closing(sqlite3.connect(database)) as connection, connection:
+        connection.execute("CREATE TABLE sites ("+OID_FIELD+" INTEGER PRIMARY KEY, a REAL, b REAL, c REAL)")
+        connection.executemany("INSERT INTO sites VALUES (?, ?, ?, ?)", rows)
+    return [csvpath, npypath, database+"/sites"]
+
+@pytest.fixture
+def tables(tmp_path):
+    return writeTables(tmp_path)
+
+def test_load(tables):
+    expected = numpy.column_stack([COLUMNS["b"], COLUMNS["a"]])
+    for table in tables:
+        oids, matrix = loadStandardizedDecisionMatrix(table, "b;a")
+        assert oids.tolist() == OIDS.tolist(), table
+        assert numpy.array_equal(matrix, expected), table
+        assert matrix.flags.c_contiguous and matrix.dtype == numpy.float64
+
+def test_backends(tables):
+    assert [type(getBackend(table)).__name__ for table in tables] == ["CSVBackend", "NPYBackend", "SQLiteBackend"]
+
+def test_rows_numbered_without_oids(tmp_path):
+    path = str(tmp_path / "plain.csv")
+    with open(path, "w") as f:
+        f.write("a,b\n0.5,0.1\n0.2,0.3\n")
+    oids, matrix = loadStandardizedDecisionMatrix(path, ["a", "b"])
+    assert oids.tolist() == [1, 2]
+    assert matrix.tolist() == [[0.5, 0.1], [0.2, 0.3]]
+
+def test_not_standardized(tables):
+    for table in tables:
+        with pytest.raises(ValueError, match="c is not standardized"):
+            loadStandardizedDecisionMatrix(table, ["a", "c"])
+
+def test_missing_field(tables):
+    for table in tables:
+        with pytest.raises(ValueError):
+            loadStandardizedDecisionMatrix(table, ["a", "nofield"])
+
+def test_write_columns(tables):
+    order = numpy.array([5, 0, 3, 1, 4, 2])
+    scores = numpy.linspace(0.5, 3.0, 6)
+    for table in tables:
+        # the columns in another row order than the table
+        writeOutputColumns(table, OIDS[order], {"SCORE": scores[order], "RANK": numpy.arange(6, 0, -1)[order]})
+        # a subset of the rows; existing fields are overwritten in the same pass
+        writeOutputColumns(table, numpy.array([21, 3]), {"SCORE": numpy.array([-1.0, -2.0]), "a": numpy.array([0.0, 0.0])})
+        oids, matrix = getBackend(table).readColumns(table, ["SCORE", "RANK", "a", "b"])
+        assert oids.tolist() == OIDS.tolist(), table
+        assert matrix[:, 0].tolist() == [0.5, -2.0, 1.5, 2.0, 2.5, -1.0], table
+        assert matrix[:, 1].tolist() == [6, 5, 4, 3, 2, 1], table
+        assert matrix[:, 2].tolist() == [0.1, 0.0, 0.0, 1.0, 0.25, 0.0], table
+        assert matrix[:, 3].tolist() == COLUMNS["b"], table
+
+def test_write_integer_fields(tables):
+    for table in tables[1:]:
+        writeOutputColumns(table, OIDS, {"RANK": numpy.arange(1, 7), "SCORE": numpy.linspace(0, 1, 6)})
+    assert numpy.load(tables[1]).dtype["RANK"].kind == "i"
+    database, name = tables[2].rsplit("/", 1)
+    with closing(sqlite3.connect(database)) as connection:
+        types = dict((row[1], row[2]) for row in connection.execute("PRAGMA table_info(sites)"))
+    assert types["RANK"] == "INTEGER" and types["SCORE"] == "REAL"
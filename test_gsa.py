@@ -0,0 +1,28 @@
+# Tests of the parallel Saltelli estimator: results for a seed must not
+# depend on the number of worker processes
+import numpy
+import pytest
+
+import gsa
+
+MINWEIGHTS = [0.1, 0.2, 0.1]
+MAXWEIGHTS = [0.5, 0.4, 0.6]
+
+def decisionMatrix(n=60, k=3, seed=4):
+    """ returns a standardized decision matrix """
+    return numpy.random.default_rng(seed).random((n, k))
+
+@pytest.mark.parametrize("bestIndex", [None, 7])
+def test_workers(bestIndex):
+    matrix = decisionMatrix()
+    # more base samples than one chunk, so the pool gets several chunks
+    N = 2*gsa.CHUNK_SAMPLES + 500
+    serial = gsa.first_total_parallel(MINWEIGHTS, MAXWEIGHTS, matrix, N, bestIndex, seed=9, workers=1)
+    parallel = gsa.first_total_parallel(MINWEIGHTS, MAXWEIGHTS, matrix, N, bestIndex, seed=9, workers=3)
+    Y, (S, ST) = serial[:2]
+    assert len(Y) == N
+    assert numpy.array_equal(parallel[0], Y)
+    assert numpy.array_equal(parallel[1][0], S)
+    assert numpy.array_equal(parallel[1][1], ST)
+    other = gsa.first_total_parallel(MINWEIGHTS, MAXWEIGHTS, matrix, N, bestIndex, seed=10, workers=1)
+    assert not numpy.array_equal(other[0], Y)
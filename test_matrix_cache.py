@@ -0,0 +1,70 @@
+# Tests of the persistent decision matrix cache: stale entries are never
+# served and the least recently used entries are evicted over the budget
+import os
+
+import numpy
+import pytest
+
+from decision_matrix import loadStandardizedDecisionMatrix, writeOutputColumns
+from matrix_cache import MatrixCache
+
+def writeCSV(path, rows, mtime=None):
+    """ writes an OBJECTID, a, b table and sets its modification time """
+    with open(path, "w") as f:
+        f.write("OBJECTID,a,b\n")
+        for i, (a, b) in enumerate(rows, start=1):
+            f.write(f"{i},{a},{b}\n")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+@pytest.fixture
+def cache(tmp_path):
+    return MatrixCache(str(tmp_path / "cache"), budget=10*1024**2)
+
+def test_served_until_edited(tmp_path, cache):
+    table = str(tmp_path / "sites.csv")
+    writeCSV(table, [(0.1, 0.2), (0.3, 0.4)], mtime=1000000)
+    oids, matrix = loadStandardizedDecisionMatrix(table, "a;b", cache=cache)
+    assert len(cache.entries()) == 1
+    cached = loadStandardizedDecisionMatrix(table, "a;b", cache=cache)
+    assert isinstance(cached[1], numpy.memmap)
+    assert numpy.array_equal(cached[1], matrix) and numpy.array_equal(cached[0], oids)
+    # same size, another modification time: the table is read again
+    writeCSV(table, [(0.1, 0.2), (0.3, 0.5)], mtime=2000000)
+    oids, matrix = loadStandardizedDecisionMatrix(table, "a;b", cache=cache)
+    assert not isinstance(matrix, numpy.memmap)
+    assert matrix.tolist() == [[0.1, 0.2], [0.3, 0.5]]
+
+def test_restamped_after_writes(tmp_path, cache):
+    table = str(tmp_path / "sites.csv")
+    writeCSV(table, [(0.1, 0.2), (0.3, 0.4)])
+    loadStandardizedDecisionMatrix(table, "a;b", cache=cache)
+    loadStandardizedDecisionMatrix(table, "a", cache=cache)
+    # writing output fields keeps the entries of the unchanged criteria
+    writeOutputColumns(table, [1, 2], {"SCORE": numpy.array([0.5, 0.7])}, cache=cache)
+    assert isinstance(loadStandardizedDecisionMatrix(table, "a;b", cache=cache)[1], numpy.memmap)
+    # writing a criterion drops the entries holding it
+    writeOutputColumns(table, [1, 2], {"b": numpy.array([0.9, 0.8])}, cache=cache)
+    assert len(cache.entries()) == 1
+    oids, matrix = loadStandardizedDecisionMatrix(table, "a;b", cache=cache)
+    assert matrix.tolist() == [[0.1, 0.9], [0.3, 0.8]]
+    assert isinstance(loadStandardizedDecisionMatrix(table, "a", cache=cache)[1], numpy.memmap)
+
+def test_least_recently_used_evicted(tmp_path):
+    cache = MatrixCache(str(tmp_path / "cache"), budget=10**9)
+    matrix = numpy.zeros((1000, 4))
+    oids = numpy.arange(1000)
+    keys = [cache.key("table"+str(i), ["a"]) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, oids, matrix, "table"+str(i), ["a"], 1)
+        os.utime(cache._path(key, ".json"), (1000000 + i, 1000000 + i))
+    # using the oldest entry makes the second one the least recently used
+    assert cache.get(keys[0], 1) is not None
+    assert cache.get(keys[1], 2) is None
+    size = cache.entries()[keys[0]][1]
+    cache.budget = 2*size
+    cache.evict()
+    assert sorted(cache.entries()) == sorted([keys[0], keys[2]])
+    assert cache.invalidate("table0") == 1
+    assert list(cache.entries()) == [keys[2]]
+    assert cache.invalidate() == 1 and cache.entries() == {}
@@ -0,0 +1,113 @@
+# Tests of the batched Monte Carlo engine against the per-iteration loop of
+# the original MonteCarloWeightedSum.py
+import random
+
+import numpy
+import pytest
+
+import montecarlo
+from accumulators import RankAcceptability, WinningIndex
+
+MINWEIGHTS = [0.1, 0.2, 0.05]
+MAXWEIGHTS = [0.5, 0.3, 0.6]
+
+def decisionMatrix(n=40, k=3, seed=1):
+    """ returns a standardized decision matrix with tied rows """
+    matrix = numpy.random.default_rng(seed).random((n, k))
+    matrix[n//2:n//2+6] = matrix[:6]
+    return matrix
+
+def getRank(inscores):
+    """ getRank of the original scripts """
+    scorespos = sorted(zip(inscores, range(len(inscores))))
+    scorespos.reverse() # scores ordered from best to worst
+    ranks = [-1]*len(inscores)
+    for i, score in enumerate(scorespos):
+        ranks[score[1]] = i+1
+    return ranks
+
+def originalMonteCarlo(matrix, minweights, maxweights, N, seed):
+    """ the per-iteration loop of MonteCarloWeightedSum.py with random.seed(seed) """
+    rng = random.Random(seed)
+    rows = len(matrix)
+    sumscores = numpy.zeros(rows, dtype=float)
+    sumranks = numpy.zeros(rows, dtype=float)
+    minranks = numpy.ones(rows, dtype=int)*999999
+    maxranks = numpy.zeros(rows, dtype=int)
+    stddata = []
+    for i in range(N):
+        raw_weights = [rng.uniform(lo, hi) for lo, hi in zip(minweights, maxweights)]
+        total = sum(raw_weights)
+        weights = [float(w)/total for w in raw_weights]
+        scores = []
+        for row in matrix.tolist():
+            score = 0.0
+            for j, criteria in enumerate(row):
+                score = score + (criteria * weights[j])
+            scores.append(score)
+        scores = numpy.array(scores)
+        ranks = numpy.array(getRank(scores))
+        sumscores = sumscores + scores
+        sumranks = sumranks + ranks
+        minranks = numpy.minimum(minranks, ranks)
+        maxranks = numpy.maximum(maxranks, ranks)
+        stddata.append(ranks)
+    stdranks = numpy.std(numpy.array(stddata, dtype=float), axis=0, dtype=numpy.float64)
+    return sumscores/float(N), sumranks/float(N), minranks, maxranks, stdranks
+
+@pytest.mark.parametrize("blocksize", [1, 7, None])
+def test_original_script(blocksize):
+    matrix = decisionMatrix()
+    expected = originalMonteCarlo(matrix, MINWEIGHTS, MAXWEIGHTS, 60, seed=5)
+    result = montecarlo.monteCarloWeightedSum(matrix, MINWEIGHTS, MAXWEIGHTS, 60, seed=5, blocksize=blocksize,
+                                              ties="legacy")
+    for name, value, original in zip(["score", "rank", "min rank", "max rank"], result[:4], expected[:4]):
+        assert numpy.array_equal(value, original), name
+    assert numpy.allclose(result[4], expected[4], rtol=0, atol=1e-9)
+
+def test_sparse_acceptability():
+    matrix = decisionMatrix(300)
+    dense = RankAcceptability(300)
+    sparse = RankAcceptability(300, topk=5)
+    halves = [RankAcceptability(300, topk=5), RankAcceptability(300, topk=5)]
+    montecarlo.monteCarloStatistics(matrix, MINWEIGHTS, MAXWEIGHTS, 80, seed=3, acceptability=dense)
+    montecarlo.monteCarloStatistics(matrix, MINWEIGHTS, MAXWEIGHTS, 80, seed=3, acceptability=sparse, blocksize=30)
+    montecarlo.monteCarloStatistics(matrix, MINWEIGHTS, MAXWEIGHTS, 40, seed=3, acceptability=halves[0])
+    montecarlo.monteCarloStatistics(matrix, MINWEIGHTS, MAXWEIGHTS, 40, seed=4, acceptability=halves[1])
+    assert numpy.allclose(dense.acceptability().sum(axis=1), 1.0)
+    # only the cells reached are kept
+    assert len(sparse.cells) == numpy.count_nonzero(dense.counts[:, :5])
+    assert numpy.array_equal(sparse.acceptability(), dense.acceptability()[:, :5])
+    for k in (1, 5):
+        assert numpy.array_equal(sparse.topProbability(k), dense.topProbability(k))
+    merged = halves[0].merge(halves[1])
+    assert merged.count == 80
+    assert merged.topProbability(5).sum() == pytest.approx(5.0)
+
+def test_winning_indices(tmp_path):
+    scores = numpy.array([[3.0, 2.0, 1.0, 1.0],
+                          [3.0, 1.0, 2.0, 0.0],
+                          [1.0, 2.0, 3.0, 0.0]])
+    winning = WinningIndex(4).update(scores[:2]).merge(WinningIndex(4).update(scores[2:]))
+    indices = winning.winning()
+    assert winning.count == 3
+    assert indices[0].tolist() == [0.0, 2/3.0, 2/3.0, 1.0]
+    # tied scores count as half a win for both sites
+    assert indices[2, 3] == pytest.approx(5/6.0)
+    assert numpy.allclose(indices + indices.T, 1.0 - numpy.eye(4))
+    ranks, copeland, condorcet = montecarlo.consensusRanking(indices)
+    assert condorcet == 0
+    assert ranks.tolist() == [1, 3, 2, 4]
+    assert copeland.tolist() == [3, 1, 2, 0]
+    # a cycle of pairwise majorities has no Condorcet winner
+    cycle = numpy.array([[0.0, 0.6, 0.4], [0.4, 0.0, 0.6], [0.6, 0.4, 0.0]])
+    ranks, copeland, condorcet = montecarlo.consensusRanking(cycle)
+    assert condorcet is None
+    assert copeland.tolist() == [1, 1, 1] and sorted(ranks.tolist()) == [1, 2, 3]
+    path = str(tmp_path / "winning.csv")
+    montecarlo.writeWinningIndices(path, [11, 12, 13, 14], indices)
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "OID,OID_11,OID_12,OID_13,OID_14"
+    assert [float(value) for value in lines[1].split(",")[1:]] == indices[0].tolist()
+    assert len(lines) == 5
@@ -0,0 +1,28 @@
+# Tests of the batch OAT for criteria against scoring every scenario's
+# decision matrix from scratch
+import numpy
+import pytest
+
+import oat
+from decision_rules import getDecisionRule
+from ranking import rankBlock
+
+@pytest.mark.parametrize("rulename", [None, "weighted_sum", "ideal_point"])
+def test_alternative_ranks(rulename):
+    rng = numpy.random.default_rng(16)
+    matrix = rng.random((200, 3))
+    altcolumns = rng.random((200, 2))
+    weights = [0.5, 0.3, 0.2]
+    scenarios = [[(0, 0)], [(2, 1)], [(0, 0), (2, 1)]]
+    # the rule exactly as the OAT For Criteria tool builds it
+    rule = rulename or "weighted_sum"
+    getDecisionRule(rule)
+    scores, ranks = oat.alternativeRanks(matrix, weights, altcolumns, scenarios, "min", rule)
+    assert scores.shape == ranks.shape == (len(scenarios)+1, 200)
+    for s, scenario in enumerate([[]] + scenarios):
+        scenariomatrix = matrix.copy()
+        for j, a in scenario:
+            scenariomatrix[:, j] = altcolumns[:, a]
+        expected = getDecisionRule(rule)(scenariomatrix, numpy.array([weights]))[0]
+        assert numpy.allclose(scores[s], expected)
+        assert numpy.array_equal(ranks[s], rankBlock(scores[s:s+1], "min")[0])
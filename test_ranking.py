@@ -0,0 +1,55 @@
+# Tests of the approximate histogram ranks against the exact ranks of rankBlock
+import numpy
+import pytest
+
+from ranking import rankBlock, histogramRankBlock, histogramBins, TIE_METHODS
+
+APPROXIMATE_TIES = [ties for ties in TIE_METHODS if ties != "dense"] + ["legacy"]
+
+def scoreBlocks():
+    """ yields (name, runs x sites) score blocks: continuous scores, scores
+        with clusters of ties, a few distinct values and constant runs """
+    rng = numpy.random.default_rng(20)
+    yield "continuous", rng.random((12, 4000))
+    clustered = rng.random((12, 4000))
+    clustered[:, :1500] = numpy.round(clustered[:, :1500], 2)
+    yield "clustered ties", clustered
+    yield "heavy ties", rng.integers(0, 5, (12, 4000)).astype(float)
+    skewed = rng.exponential(1.0, (12, 4000))**4
+    yield "skewed", skewed
+    yield "constant", numpy.ones((3, 50))
+
+@pytest.mark.parametrize("ties", APPROXIMATE_TIES)
+def test_zero_error_is_exact(ties):
+    for name, scores in scoreBlocks():
+        ranks, errors = histogramRankBlock(scores, 0, ties)
+        assert numpy.array_equal(ranks, rankBlock(scores, ties).astype(float)), name
+        assert (errors == 0).all(), name
+
+@pytest.mark.parametrize("ties", APPROXIMATE_TIES)
+@pytest.mark.parametrize("maxerror", [1, 5, 50, 500])
+def test_error_within_reported_bound(ties, maxerror):
+    for name, scores in scoreBlocks():
+        ranks, errors = histogramRankBlock(scores, maxerror, ties)
+        exact = rankBlock(scores, ties).astype(float)
+        observed = numpy.abs(ranks - exact).max(axis=1)
+        assert (observed <= errors).all(), name
+        assert (errors <= maxerror).all(), name
+
+def test_fixed_bins_report_their_error():
+    scores = numpy.random.default_rng(21).random((5, 3000))
+    ranks, errors = histogramRankBlock(scores, 3000, "average", bins=16)
+    observed = numpy.abs(ranks - rankBlock(scores, "average")).max(axis=1)
+    assert (observed <= errors).all()
+    assert (errors > 0).all()
+
+def test_bins():
+    assert histogramBins(10, 5) == 10
+    assert histogramBins(10**6, 10) == 2*10**6//21
+
+def test_dense_and_negative_error_rejected():
+    scores = numpy.random.default_rng(22).random((2, 10))
+    with pytest.raises(ValueError):
+        histogramRankBlock(scores, 1, "dense")
+    with pytest.raises(ValueError):
+        histogramRankBlock(scores, -1, "ordinal")
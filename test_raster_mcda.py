@@ -0,0 +1,35 @@
+# Tests of the tiled cell-wise scoring of criterion rasters against the
+# scoring of the same cells as one decision matrix
+import numpy
+import pytest
+
+from decision_rules import getDecisionRule
+from raster_mcda import rasterScores
+
+def writeNPY(path, grid):
+    """ saves grid as a .npy raster of 10 m cells with its world file """
+    numpy.save(path, grid)
+    with open(path[:-4]+".wld", "w") as f:
+        f.write("10\n0\n0\n-10\n1005\n2065\n")
+    return path
+
+@pytest.fixture
+def bands(tmp_path):
+    rng = numpy.random.default_rng(22)
+    a = 0.2 + 0.6*rng.random((5, 6))
+    b = rng.random((5, 6))
+    # the only cell with the best value of a is left out by the NoData of b
+    a[1, 1], b[1, 1] = 1.0, numpy.nan
+    a[3, 4] = numpy.nan
+    return [writeNPY(str(tmp_path / "a.npy"), a), writeNPY(str(tmp_path / "b.npy"), b)], numpy.dstack([a, b])
+
+@pytest.mark.parametrize("rule", ["weighted_sum", "ideal_point"])
+@pytest.mark.parametrize("tilesize", [1, 4, 512])
+def test_scores(tmp_path, bands, rule, tilesize):
+    paths, stack = bands
+    outpath = str(tmp_path / "score.npy")
+    assert rasterScores(paths, outpath, [3, 1], rule, tilesize) == 28
+    valid = ~numpy.isnan(stack).any(axis=2)
+    expected = numpy.full(valid.shape, numpy.nan)
+    expected[valid] = getDecisionRule(rule)(stack[valid], [numpy.array([0.75, 0.25])])[0]
+    assert numpy.allclose(numpy.load(outpath), expected, equal_nan=True, rtol=0, atol=1e-12)
@@ -0,0 +1,61 @@
+# Tests of the raster sources and of sampling raster values at points, on
+# ASCII grids and .npy rasters standing in for raster datasets
+import numpy
+import pytest
+
+from rasters import getRaster, sampleRaster, readPoints
+
+# 7 x 5 grid of 10 m cells, upper left corner at (1000, 2070)
+NODATA = -9999
+GRID = numpy.arange(35, dtype=float).reshape(7, 5)
+GRID[2, 3] = NODATA
+
+def writeAscii(path, grid, blanklines=False):
+    """ writes grid as an ESRI ASCII grid, optionally with blank lines between rows """
+    with open(path, "w") as f:
+        f.write("ncols 5\nnrows 7\nxllcorner 1000\nyllcorner 2000\ncellsize 10\nNODATA_value "+str(NODATA)+"\n")
+        for row in grid.tolist():
+            f.write(" ".join(repr(value) for value in row)+"\n")
+            if blanklines:
+                f.write("\n")
+    return path
+
+def writeNPY(path, grid):
+    """ saves grid as a .npy raster with its world file, NaN on NoData """
+    numpy.save(path, numpy.where(grid == NODATA, numpy.nan, grid))
+    with open(path[:-4]+".wld", "w") as f:
+        f.write("10\n0\n0\n-10\n1005\n2065\n")
+    return path
+
+@pytest.fixture(params=["asc", "asc with blank lines", "npy"])
+def raster(request, tmp_path):
+    if request.param == "npy":
+        return getRaster(writeNPY(str(tmp_path / "grid.npy"), GRID))
+    return getRaster(writeAscii(str(tmp_path / "grid.asc"), GRID, request.param != "asc"))
+
+def test_grid(raster):
+    assert (raster.nrows, raster.ncols) == (7, 5)
+    assert (raster.x0, raster.y0, raster.cellwidth, raster.cellheight) == (1000, 2070, 10, 10)
+    # windows start at the right row, whatever row is read first
+    for row, col, nrows, ncols in [(5, 1, 2, 3), (0, 0, 7, 5), (3, 4, 1, 1), (1, 2, 4, 2)]:
+        window = numpy.where(GRID == NODATA, numpy.nan, GRID)[row:row+nrows, col:col+ncols]
+        block = raster.readBlock(row, col, nrows, ncols)
+        assert numpy.array_equal(numpy.where(block == NODATA, numpy.nan, block), window, equal_nan=True)
+
+@pytest.mark.parametrize("blockrows", [None, 1, 3])
+def test_sample(raster, blockrows):
+    x = numpy.array([1001.0, 1049.9, 1035.0, 1025.0, 999.0, 1015.0, 1005.0])
+    y = numpy.array([2069.0, 2000.1, 2045.0, 2035.0, 2035.0, 2071.0, 2010.0])
+    values = sampleRaster(raster, x, y, blockrows)
+    # the last but two points are outside the raster, [2] is on NoData
+    expected = [GRID[0, 0], GRID[6, 4], numpy.nan, GRID[3, 2], numpy.nan, numpy.nan, GRID[6, 0]]
+    assert numpy.array_equal(values, expected, equal_nan=True)
+
+def test_points(tmp_path):
+    table = str(tmp_path / "points.csv")
+    with open(table, "w") as f:
+        f.write("OBJECTID,X,Y\n4,1001.0,2069.0\n9,1025.0,2035.0\n")
+    oids, x, y = readPoints(table, "X;Y")
+    assert oids.tolist() == [4, 9] and x.tolist() == [1001.0, 1025.0] and y.tolist() == [2069.0, 2035.0]
+    with pytest.raises(ValueError):
+        readPoints(table)
@@ -0,0 +1,46 @@
+# Tests of the stratification and block independence of the weight samplers
+import random
+
+import numpy
+import pytest
+
+from samplers import getSampler, SobolSampler, LatinHypercubeSampler, LHS_PAGE
+
+def test_pseudo_random_order():
+    points = getSampler("random", 3, 10, seed=7).draw(4)
+    rng = random.Random(7)
+    assert points.tolist() == [[rng.random() for j in range(3)] for i in range(4)]
+
+def test_sobol_sequence():
+    # the first unscrambled points of the first two dimensions
+    points = SobolSampler(2, scramble=False).block(0, 4)
+    assert points.tolist() == [[0.0, 0.0], [0.5, 0.5], [0.75, 0.25], [0.25, 0.75]]
+
+@pytest.mark.parametrize("k", [3, 12])
+def test_sobol_stratified(k):
+    sampler = SobolSampler(k, seed=11)
+    points = sampler.draw(256)
+    assert ((points >= 0) & (points < 1)).all()
+    # every dimension has one point in each of the 256 equal intervals
+    for d in range(k):
+        assert sorted(numpy.floor(points[:, d]*256).astype(int).tolist()) == list(range(256))
+    # points drawn in blocks equal the points drawn at once
+    assert numpy.array_equal(sampler.draw(100), SobolSampler(k, seed=11).block(256, 100))
+    assert not numpy.array_equal(points, SobolSampler(k, seed=12).block(0, 256))
+
+def test_latin_hypercube():
+    N = LHS_PAGE + 300
+    sampler = LatinHypercubeSampler(4, N, seed=3)
+    points = sampler.block(0, N)
+    assert ((points >= 0) & (points < 1)).all()
+    for d in range(4):
+        assert sorted(numpy.floor(points[:, d]*N).astype(int).tolist()) == list(range(N))
+    # a point does not depend on the blocks it is drawn in
+    blocks = [sampler.draw(runs) for runs in (1000, 3000, N - 4000)]
+    assert numpy.array_equal(numpy.concatenate(blocks), points)
+    with pytest.raises(ValueError):
+        sampler.draw(1)
+
+def test_unknown_sampler():
+    with pytest.raises(ValueError):
+        getSampler("halton", 3, 10)
@@ -0,0 +1,51 @@
+# Tests of the approximate rank (rankerror) modes of the Monte Carlo and GSA
+# engines against their exact runs
+import numpy
+import pytest
+
+import gsa
+import montecarlo
+
+MINWEIGHTS = [0.1, 0.1, 0.1, 0.1]
+MAXWEIGHTS = [0.4, 0.4, 0.4, 0.4]
+
+def decisionMatrix(n=3000, k=4, seed=30):
+    """ returns a standardized decision matrix with some tied rows """
+    matrix = numpy.random.default_rng(seed).random((n, k))
+    matrix[:n//4] = numpy.round(matrix[:n//4], 1)
+    return matrix
+
+@pytest.mark.parametrize("ties", ["ordinal", "min", "average", "legacy"])
+@pytest.mark.parametrize("tracked", [None, [3, 10, 2000]])
+def test_montecarlo_rankerror(ties, tracked):
+    matrix = decisionMatrix()
+    exact = montecarlo.monteCarloStatistics(matrix, MINWEIGHTS, MAXWEIGHTS, 400, seed=1, ties=ties, tracked=tracked)
+    for rankerror in (0, 2, 25):
+        scorestats, rankstats = montecarlo.monteCarloStatistics(matrix, MINWEIGHTS, MAXWEIGHTS, 400, seed=1, ties=ties,
+                                                                tracked=tracked, rankerror=rankerror)
+        assert numpy.array_equal(scorestats.mean(), exact[0].mean())
+        assert rankstats.rankerror <= rankerror
+        bound = rankstats.rankerror + 1e-9
+        assert numpy.abs(rankstats.mean() - exact[1].mean()).max() <= bound
+        assert numpy.abs(rankstats.minimum - exact[1].minimum).max() <= bound
+        assert numpy.abs(rankstats.maximum - exact[1].maximum).max() <= bound
+        if rankerror == 0:
+            assert numpy.array_equal(rankstats.mean(), exact[1].mean())
+
+def test_montecarlo_rankerror_dense_rejected():
+    with pytest.raises(ValueError):
+        montecarlo.monteCarloStatistics(decisionMatrix(100), MINWEIGHTS, MAXWEIGHTS, 10, seed=1, ties="dense", rankerror=1)
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_gsa_rankerror(workers):
+    matrix = decisionMatrix(800)
+    Y, (S, ST), CI = gsa.first_total_parallel(MINWEIGHTS, MAXWEIGHTS, matrix, 1100, seed=2, workers=workers)
+    same = gsa.first_total_parallel(MINWEIGHTS, MAXWEIGHTS, matrix, 1100, seed=2, workers=workers, rankerror=0)
+    assert numpy.array_equal(same[0], Y)
+    assert numpy.array_equal(same[1][0], S) and numpy.array_equal(same[1][1], ST)
+    for rankerror in (2, 25):
+        approximate = gsa.first_total_parallel(MINWEIGHTS, MAXWEIGHTS, matrix, 1100, seed=2, workers=workers, rankerror=rankerror)
+        # the average shift of every run is within the error of its ranks
+        assert numpy.abs(approximate[0] - Y).max() <= rankerror
+        assert numpy.abs(approximate[1][0] - S).max() < 0.05
+        assert numpy.abs(approximate[1][1] - ST).max() < 0.05
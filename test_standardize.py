@@ -0,0 +1,71 @@
+# Tests of the multi-field standardization against the transforms of the
+# original Standard.py, in memory and in chunks
+import csv
+
+import numpy
+import pytest
+
+from decision_matrix import getBackend
+from standardize import standardizeFields
+
+def writeCSV(path, columns):
+    """ writes the columns (dictionary of field -> values) as a CSV table """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["OBJECTID"] + list(columns))
+        for i, row in enumerate(zip(*columns.values()), start=1):
+            writer.writerow([i] + list(row))
+    return path
+
+def readCSV(path, fields):
+    return getBackend(path).readColumns(path, fields)[1]
+
+@pytest.mark.parametrize("chunkrows", [None, 2])
+def test_methods(tmp_path, chunkrows):
+    a = [2.0, 8.0, 4.0, 5.0, 10.0]
+    b = [1.0, 4.0, 2.0, 8.0, 0.5]
+    table = writeCSV(str(tmp_path / "raw.csv"), {"a": a, "b": b})
+    methods = [("Score Range", "Benefit"), ("Score Range", "Cost"),
+               ("Ratio (Linear Scale)", "Benefit"), ("Ratio (Linear Scale)", "Cost")]
+    for i, (method, benefit) in enumerate(methods):
+        mins, maxes = standardizeFields(table, "a;b", ["a"+str(i), "b"+str(i)], method, benefit, chunkrows)
+        assert mins.tolist() == [2.0, 0.5] and maxes.tolist() == [10.0, 8.0]
+    a, b = numpy.array(a), numpy.array(b)
+    expected = [(a - 2)/8, (b - 0.5)/7.5, (10 - a)/8, (8 - b)/7.5, a/10, b/8, 2/a, 0.5/b]
+    result = readCSV(table, [name+str(i) for i in range(4) for name in "ab"])
+    assert numpy.allclose(result, numpy.column_stack(expected), rtol=0, atol=1e-15)
+
+def test_per_field_choices(tmp_path):
+    table = writeCSV(str(tmp_path / "raw.csv"), {"a": [1.0, 3.0, 5.0], "b": [1.0, 2.0, 4.0]})
+    standardizeFields(table, ["a", "b"], ["sa", "sb"], ["score range", "Ratio (Linear Scale)"], ["Cost", "benefit"])
+    assert readCSV(table, ["sa", "sb"]).tolist() == [[1.0, 0.25], [0.5, 0.5], [0.0, 1.0]]
+
+@pytest.mark.parametrize("chunkrows", [None, 1])
+def test_zero_benefit_ratio(tmp_path, chunkrows):
+    table = writeCSV(str(tmp_path / "raw.csv"), {"a": [0.0, 5.0, 10.0]})
+    standardizeFields(table, ["a"], ["sa"], "Ratio (Linear Scale)", "Benefit", chunkrows)
+    assert readCSV(table, ["sa"])[:, 0].tolist() == [0.0, 0.5, 1.0]
+    # MIN/value divides by the zero of a cost ratio
+    with pytest.raises(ValueError, match="a has values of 0 or below"):
+        standardizeFields(table, ["a"], ["sb"], "Ratio (Linear Scale)", "Cost", chunkrows)
+
+def test_unusable_ranges(tmp_path):
+    table = writeCSV(str(tmp_path / "raw.csv"), {"a": [0.0, 0.0], "b": [3.0, 3.0], "c": [-1.0, 2.0]})
+    with pytest.raises(ValueError):
+        standardizeFields(table, ["a"], ["sa"], "Ratio (Linear Scale)", "Benefit")
+    with pytest.raises(ValueError, match="single value"):
+        standardizeFields(table, ["b"], ["sb"], "Score Range", "Benefit")
+    with pytest.raises(ValueError):
+        standardizeFields(table, ["c"], ["sc"], "Ratio (Linear Scale)", "Benefit")
+    with pytest.raises(ValueError):
+        standardizeFields(table, ["a"], ["sa", "sb"], "Score Range", "Benefit")
+
+@pytest.mark.parametrize("chunkrows", [None, 2])
+def test_empty_values(tmp_path, chunkrows):
+    table = str(tmp_path / "raw.csv")
+    with open(table, "w") as f:
+        f.write("OBJECTID,a\n1,2.0\n2,\n3,6.0\n")
+    mins, maxes = standardizeFields(table, ["a"], ["sa"], "Score Range", "Benefit", chunkrows)
+    assert mins.tolist() == [2.0] and maxes.tolist() == [6.0]
+    result = readCSV(table, ["sa"])[:, 0]
+    assert result[0] == 0.0 and numpy.isnan(result[1]) and result[2] == 1.0
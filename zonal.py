@@ -0,0 +1,318 @@
+# Zonal statistics of a raster over polygons
+#
+# The polygons are RASTERIZED once into a ZONE GRID aligned to the raster:
+# an integer label per cell (0 outside the polygons, i+1 for polygon i), a
+# cell belonging to a polygon when its center is inside (even-odd rule, so
+# holes stay empty; where polygons overlap the later one wins). The grid
+# only covers the extent of the polygons and is saved as a memory-mapped
+# .npy file in the ZONE CACHE, keyed by the polygon dataset and its edit
+# stamp and by the geotransform of the raster, so other rasters of the same
+# grid reuse it
+#
+# STATISTICS (mean, min, max, majority, count of the valid cells of every
+# polygon) are computed band of rows by band of rows, each band with one
+# group reduction over the labels (bincount, ufunc.at), so memory depends on
+# the band size and the number of polygons, not on the raster size; the
+# majority counts every distinct (polygon, value) pair, so it is only
+# computed for integer rasters
+#
+# Without an edit stamp of the polygons the zone grid is not cached but
+# written to a temporary file, removed by ZoneGrid.close
+#
+# POLYGONS are read from feature classes through arcpy, or from a GeoJSON
+# file (.geojson) standing in for one on machines without ArcGIS
+#------------- IMPORTS ------------------------------------------------
+import os, json, glob, shutil, hashlib, tempfile
+import numpy
+
+from decision_matrix import getBackend, fileStamp
+from matrix_cache import jsonValue
+
+STATISTICS = ("mean", "min", "max", "majority", "count")
+
+DEFAULT_ZONE_CACHE = os.path.join(tempfile.gettempdir(), "th4_zone_cache")
+
+# edge and row crossings tested at once by polygonSpans
+CROSSING_ELEMENTS = 2**22
+# cell spans filled at once by rasterizePolygons
+SPAN_BATCH = 2**16
+
+# ----- class definitions ----------------------------------------------
+
+class ZoneGrid(object):
+    """ zone labels of a window of raster cells """
+
+    def __init__(self, path, top, left, oids, temporary=False):
+        """
+            in: path of the .npy label grid (string), top and left raster row
+                and column of the window (int), oids ObjectIDs of the polygons
+                (label i+1 is polygon i), temporary if the grid is not cached
+        """
+        self.path = path
+        self.temporary = temporary
+        self.top = int(top)
+        self.left = int(left)
+        self.oids = numpy.asarray(oids, dtype=numpy.int64)
+        self.labels = numpy.load(path, mmap_mode="r")
+        self.height, self.width = self.labels.shape
+
+    def close(self):
+        """ removes the files of a temporary zone grid """
+        if self.temporary:
+            self.labels = None
+            for path in (self.path, self.path[:-4]+".oid.npy"):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.temporary = False
+
+# ----- function definitions -------------------------------------------
+
+def readPolygons(table, backend=None):
+    """
+        in: polygon feature class or layer (string), or GeoJSON file (.geojson)
+        out: (oids, polygons) where every polygon is a list of rings (numpy
+             arrays of x, y vertices), outer and inner rings alike
+    """
+    if table.lower().endswith(".geojson"):
+        with open(table) as f:
+            features = json.load(f)["features"]
+        oids, polygons = [], []
+        for i, feature in enumerate(features):
+            geometry = feature["geometry"]
+            if geometry["type"] == "Polygon":
+                parts = [geometry["coordinates"]]
+            elif geometry["type"] == "MultiPolygon":
+                parts = geometry["coordinates"]
+            else:
+                raise ValueError(table+" holds "+geometry["type"]+" features; zonal statistics need polygons")
+            oids.append(int((feature.get("properties") or {}).get("OBJECTID", i+1)))
+            polygons.append([numpy.asarray(ring, dtype=float)[:, :2] for part in parts for ring in part])
+        return numpy.array(oids, dtype=numpy.int64), polygons
+    import arcpy
+    if arcpy.Describe(table).shapeType != "Polygon":
+        raise ValueError(table+" is not a polygon feature class; zonal statistics need polygons")
+    oids, polygons = [], []
+    with arcpy.da.SearchCursor(table, ["OID@", "SHAPE@"]) as cursor:
+        for oid, shape in cursor:
+            rings = []
+            for part in (shape or []):
+                ring = []
+                # inner rings follow the outer ring after a None separator
+                for point in part:
+                    if point is None:
+                        rings.append(ring)
+                        ring = []
+                    else:
+                        ring.append((point.X, point.Y))
+                rings.append(ring)
+            oids.append(oid)
+            polygons.append([numpy.array(ring, dtype=float).reshape(-1, 2) for ring in rings if len(ring) > 2])
+    return numpy.array(oids, dtype=numpy.int64), polygons
+
+def polygonSpans(rings, raster):
+    """ returns (rows, starts, stops) of the row spans of raster cells whose
+        centers are inside the polygon made of rings (even-odd rule) """
+    rings = [ring for ring in rings if len(ring) > 2]
+    empty = numpy.array([], dtype=numpy.intp)
+    if not rings:
+        return empty, empty, empty
+    x1 = numpy.concatenate([ring[:, 0] for ring in rings])
+    y1 = numpy.concatenate([ring[:, 1] for ring in rings])
+    x2 = numpy.concatenate([numpy.roll(ring[:, 0], -1) for ring in rings])
+    y2 = numpy.concatenate([numpy.roll(ring[:, 1], -1) for ring in rings])
+    top = max(0, int(numpy.floor((raster.y0 - y1.max())/raster.cellheight)))
+    bottom = min(raster.nrows - 1, int(numpy.floor((raster.y0 - y1.min())/raster.cellheight)))
+    if bottom < top:
+        return empty, empty, empty
+    spans = []
+    step = max(1, CROSSING_ELEMENTS//len(x1))
+    for start in range(top, bottom + 1, step):
+        rows = numpy.arange(start, min(start + step, bottom + 1))
+        centers = raster.y0 - (rows + 0.5)*raster.cellheight
+        edge, row = numpy.nonzero((y1[:, None] <= centers) != (y2[:, None] <= centers))
+        if len(edge) == 0:
+            continue
+        crossing = x1[edge] + (centers[row] - y1[edge])*(x2[edge] - x1[edge])/(y2[edge] - y1[edge])
+        order = numpy.lexsort((crossing, row))
+        row, crossing = row[order], crossing[order]
+        # crossings of a row pair up into inside spans
+        first = numpy.searchsorted(row, row)
+        entering = (numpy.arange(len(row)) - first) % 2 == 0
+        enter, leave = numpy.flatnonzero(entering), numpy.flatnonzero(entering) + 1
+        starts = numpy.ceil((crossing[enter] - raster.x0)/raster.cellwidth - 0.5)
+        stops = numpy.ceil((crossing[leave] - raster.x0)/raster.cellwidth - 0.5)
+        starts = numpy.clip(starts, 0, raster.ncols).astype(numpy.intp)
+        stops = numpy.clip(stops, 0, raster.ncols).astype(numpy.intp)
+        keep = stops > starts
+        spans.append((rows[row[enter]][keep], starts[keep], stops[keep]))
+    if not spans:
+        return empty, empty, empty
+    return tuple(numpy.concatenate(part) for part in zip(*spans))
+
+def rasterizePolygons(polygons, raster, path):
+    """ writes the zone labels of the polygons over raster to the .npy file
+        path and returns (top, left) of the window it covers """
+    # window of the raster covered by the polygon vertices
+    bounds = numpy.array([(ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max())
+                          for rings in polygons for ring in rings if len(ring) > 2]).reshape(-1, 4)
+    top = left = height = width = 0
+    if len(bounds):
+        top = max(0, int(numpy.floor((raster.y0 - bounds[:, 3].max())/raster.cellheight)))
+        bottom = min(raster.nrows - 1, int(numpy.floor((raster.y0 - bounds[:, 1].min())/raster.cellheight)))
+        left = max(0, int(numpy.floor((bounds[:, 0].min() - raster.x0)/raster.cellwidth)))
+        right = min(raster.ncols - 1, int(numpy.floor((bounds[:, 2].max() - raster.x0)/raster.cellwidth)))
+        if bottom >= top and right >= left:
+            height, width = bottom - top + 1, right - left + 1
+    labels = numpy.lib.format.open_memmap(path, mode="w+", dtype=numpy.int32, shape=(height, width))
+    cells = labels.reshape(-1)
+    batch = []
+    def fill(cells, batch):
+        rows, starts, stops, zone = [numpy.concatenate(part) for part in zip(*batch)]
+        lengths = stops - starts
+        offsets = numpy.cumsum(lengths) - lengths
+        flat = numpy.repeat((rows - top)*width + starts - left - offsets, lengths) + numpy.arange(lengths.sum())
+        # later polygons are written last, so they win where polygons overlap
+        cells[flat] = numpy.repeat(zone, lengths)
+    size = 0
+    for label, rings in enumerate(polygons, start=1):
+        rows, starts, stops = polygonSpans(rings, raster)
+        if len(rows) == 0:
+            continue
+        batch.append((rows, starts, stops, numpy.full(len(rows), label, dtype=numpy.int32)))
+        size += len(rows)
+        if size >= SPAN_BATCH:
+            fill(cells, batch)
+            batch, size = [], 0
+    if batch:
+        fill(cells, batch)
+    labels.flush()
+    del cells, labels
+    return top, left
+
+def getZoneGrid(table, raster, cachedir=None):
+    """
+        in: polygon feature class or GeoJSON file (string), raster source (see
+            rasters.getRaster), cachedir directory of the zone cache (string,
+            None uses TH4_ZONE_CACHE or the default)
+        out: ZoneGrid of the polygons over the raster, from the cache when
+             the polygons and the raster grid are unchanged (a temporary one,
+             to close after use, when the polygons have no edit stamp)
+    """
+    cachedir = cachedir or os.environ.get("TH4_ZONE_CACHE", DEFAULT_ZONE_CACHE)
+    os.makedirs(cachedir, exist_ok=True)
+    if table.lower().endswith(".geojson"):
+        stamp = (os.path.abspath(table), fileStamp(table))
+    else:
+        stamp = getBackend(table).stamp(table)
+    grid = [raster.x0, raster.y0, raster.cellwidth, raster.cellheight, raster.nrows, raster.ncols]
+    if stamp is None:
+        key = None
+    else:
+        text = json.dumps([os.path.normcase(stamp[0]), jsonValue(stamp[1]), jsonValue(grid)])
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        info = os.path.join(cachedir, key+".json")
+        if os.path.exists(info):
+            try:
+                with open(info) as f:
+                    window = json.load(f)
+                return ZoneGrid(os.path.join(cachedir, key+".npy"), window["top"], window["left"],
+                                numpy.load(os.path.join(cachedir, key+".oid.npy")))
+            except (OSError, ValueError, KeyError):
+                pass
+    oids, polygons = readPolygons(table)
+    if key is None:
+        handle, path = tempfile.mkstemp(suffix=".npy", prefix="zones_", dir=cachedir)
+        os.close(handle)
+    else:
+        path = os.path.join(cachedir, key+".npy")
+    top, left = rasterizePolygons(polygons, raster, path)
+    numpy.save(path[:-4]+".oid.npy", oids)
+    if key is not None:
+        with open(os.path.join(cachedir, key+".json"), "w") as f:
+            json.dump({"top": top, "left": left, "table": stamp[0]}, f)
+    return ZoneGrid(path, top, left, oids, temporary=key is None)
+
+def clearZoneCache(cachedir=None):
+    """ removes every cached zone grid and returns how many there were """
+    cachedir = cachedir or os.environ.get("TH4_ZONE_CACHE", DEFAULT_ZONE_CACHE)
+    if not os.path.isdir(cachedir):
+        return 0
+    count = len(glob.glob(os.path.join(cachedir, "*.oid.npy")))
+    shutil.rmtree(cachedir, ignore_errors=True)
+    return count
+
+def majorityPairs(labels, values, counts=None):
+    """ returns (labels, values, counts) of the distinct (label, value) pairs """
+    if counts is None:
+        counts = numpy.ones(len(labels), dtype=numpy.int64)
+    order = numpy.lexsort((values, labels))
+    labels, values, counts = labels[order], values[order], counts[order]
+    new = numpy.ones(len(labels), dtype=bool)
+    new[1:] = (labels[1:] != labels[:-1]) | (values[1:] != values[:-1])
+    starts = numpy.flatnonzero(new)
+    return labels[starts], values[starts], numpy.add.reduceat(counts, starts) if len(starts) else counts[:0]
+
+def zonalStatistics(zones, raster, statistics=STATISTICS, blockrows=None):
+    """
+        in: zones ZoneGrid of the polygons (see getZoneGrid), raster source,
+            statistics to compute (see STATISTICS),
+            blockrows number of raster rows read at once (int, None reads the
+            whole window of the polygons)
+        out: dictionary of statistic -> numpy array aligned with zones.oids
+             (NaN for polygons without valid cells; the majority is the most
+             frequent value, the smallest of tied values, of integer rasters only)
+    """
+    statistics = [statistic.lower() for statistic in statistics]
+    for statistic in statistics:
+        if statistic not in STATISTICS:
+            raise ValueError("unknown statistic "+statistic+"; use one of "+", ".join(STATISTICS))
+    if "majority" in statistics and not raster.integer:
+        raise ValueError("the majority is only computed for integer rasters")
+    m = len(zones.oids)
+    count = numpy.zeros(m, dtype=numpy.int64)
+    total = numpy.zeros(m, dtype=float)
+    minimum = numpy.full(m, numpy.inf)
+    maximum = numpy.full(m, -numpy.inf)
+    pairs = None
+    blockrows = zones.height if blockrows is None else max(1, int(blockrows))
+    for start in range(0, zones.height, blockrows):
+        labels = numpy.asarray(zones.labels[start:start+blockrows])
+        if not labels.any():
+            continue
+        values = raster.readBlock(zones.top + start, zones.left, labels.shape[0], zones.width).astype(float)
+        valid = (labels > 0) & ~numpy.isnan(values)
+        if raster.nodata is not None:
+            valid &= values != raster.nodata
+        zone = labels[valid] - 1
+        values = values[valid]
+        count += numpy.bincount(zone, minlength=m)
+        total += numpy.bincount(zone, weights=values, minlength=m)
+        numpy.minimum.at(minimum, zone, values)
+        numpy.maximum.at(maximum, zone, values)
+        if "majority" in statistics:
+            block = majorityPairs(zone, values)
+            if pairs is not None:
+                block = majorityPairs(*[numpy.concatenate(part) for part in zip(pairs, block)])
+            pairs = block
+    found = count > 0
+    result = {}
+    for statistic in statistics:
+        if statistic == "count":
+            result[statistic] = count
+        elif statistic == "mean":
+            result[statistic] = numpy.where(found, total/numpy.maximum(count, 1), numpy.nan)
+        elif statistic == "min":
+            result[statistic] = numpy.where(found, minimum, numpy.nan)
+        elif statistic == "max":
+            result[statistic] = numpy.where(found, maximum, numpy.nan)
+        else:
+            majority = numpy.full(m, numpy.nan)
+            if pairs is not None and len(pairs[0]):
+                zone, values, counts = pairs
+                # per zone the highest count, the smallest value among ties
+                order = numpy.lexsort((values, -counts, zone))
+                first = numpy.ones(len(order), dtype=bool)
+                first[1:] = zone[order][1:] != zone[order][:-1]
+                majority[zone[order][first]] = values[order][first]
+            result[statistic] = majority
+    return result